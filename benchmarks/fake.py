@@ -0,0 +1,250 @@
+import collections
+import random
+import threading
+import time
+
+from yandex_music import (
+    Album,
+    AlbumEvent,
+    Artist,
+    ArtistEvent,
+    ArtistTracks,
+    ChartInfo,
+    Cover,
+    Day,
+    DownloadInfo,
+    Event,
+    Feed,
+    Like,
+    Pager,
+    Playlist,
+    Search,
+    SearchResult,
+    Sequence,
+    StationTracksResult,
+    Track,
+    TrackShort,
+    TracksList,
+    User,
+)
+
+
+USER_ID = 1000
+ARTISTS = 50
+EVENTS = 12
+RADIO_BATCH = 5
+
+
+class FakeClient:
+    """Offline stand-in for ``yandex_music.Client`` serving synthetic data.
+
+    Albums, charts, playlists, track feed events and search pages hold
+    ``size`` tracks each. Every call sleeps ``latency`` seconds plus up to
+    ``jitter`` seconds either way and is counted in :attr:`calls`.
+    """
+
+    def __init__(self, size=100, latency=0.0, jitter=0.0, seed=0):
+        self.size = size
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = collections.Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def record(self, method):
+        """Count a call of the API ``method`` and wait for its latency."""
+        with self._lock:
+            self.calls[method] += 1
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def artist(index):
+        index = int(index) % ARTISTS
+        return Artist(
+            id=str(index),
+            name=f'Artist {index}',
+            cover=Cover(uri=f'avatars.yandex.net/get-music-content/artist/{index}/%%'),
+        )
+
+    @staticmethod
+    def album(index):
+        index = int(index)
+        return Album(
+            id=str(index),
+            title=f'Album {index}',
+            artists=[FakeClient.artist(index)],
+            cover_uri=f'avatars.yandex.net/get-music-content/album/{index}/%%',
+        )
+
+    def track(self, index):
+        index = int(index)
+        album_index = index // self.size
+        return Track(
+            id=str(index),
+            title=f'Track {index}',
+            artists=[self.artist(album_index)],
+            albums=[self.album(album_index)],
+            duration_ms=180000 + index % 60000,
+            cover_uri=f'avatars.yandex.net/get-music-content/album/{album_index}/%%',
+        )
+
+    def tracks_of(self, album_index):
+        start = int(album_index) * self.size
+        return [self.track(index) for index in range(start, start + self.size)]
+
+    def playlist(self, kind, tracks):
+        return Playlist(
+            uid=USER_ID,
+            kind=int(kind),
+            revision=1,
+            title=f'Playlist {kind}',
+            tracks=[TrackShort(id=track.id, timestamp='', track=track) for track in tracks],
+            owner=User(uid=USER_ID, login='user'),
+            cover=Cover(uri=f'avatars.yandex.net/get-music-content/playlist/{kind}/%%'),
+            made_for=None,
+            play_counter=None,
+            playlist_absence=None,
+        )
+
+    def feed(self):
+        self.record('feed')
+        events = []
+        for index in range(EVENTS):
+            kind = ('albums', 'artists', 'tracks')[index % 3]
+            events.append(Event(
+                id=f'event-{index}',
+                type=kind,
+                title=f'Event {index}',
+                albums=[AlbumEvent(album=self.album(index), tracks=[])] if kind == 'albums' else [],
+                artists=[ArtistEvent(
+                    artist=self.artist(index),
+                    tracks=[],
+                    similar_to_artists_from_history=[],
+                    subscribed=False,
+                )] if kind == 'artists' else [],
+                tracks=self.tracks_of(index) if kind == 'tracks' else [],
+            ))
+        return Feed(
+            days=[Day(day='2022-06-30', events=events, tracks_to_play_with_ads=[], tracks_to_play=[])],
+            can_get_more_events=False,
+            pumpkin=False,
+            is_wizard_passed=False,
+            generated_playlists=[],
+            headlines=[],
+            today='2022-06-30',
+        )
+
+    def albums_with_tracks(self, album_id):
+        self.record('albums_with_tracks')
+        album = self.album(album_id)
+        album.volumes = [self.tracks_of(album_id)]
+        return album
+
+    def artists_tracks(self, artist_id, page=0, page_size=20):
+        self.record('artists_tracks')
+        start = page * page_size
+        tracks = [self.track(index) for index in range(start, min(start + page_size, self.size))]
+        return ArtistTracks(tracks=tracks, pager=Pager(total=self.size, page=page, per_page=page_size))
+
+    def tracks(self, track_ids):
+        self.record('tracks')
+        track_ids = track_ids if isinstance(track_ids, list) else [track_ids]
+        return [self.track(track_id) for track_id in track_ids]
+
+    def albums(self, album_ids):
+        self.record('albums')
+        return [self.album(album_id) for album_id in album_ids]
+
+    def artists(self, artist_ids):
+        self.record('artists')
+        return [self.artist(artist_id) for artist_id in artist_ids]
+
+    def playlists_list(self, playlist_ids):
+        self.record('playlists_list')
+        return [
+            self.playlist(kind, self.tracks_of(kind))
+            for kind in (str(playlist_id).split(':')[-1] for playlist_id in playlist_ids)
+        ]
+
+    def chart(self, chart_option=''):
+        self.record('chart')
+        return ChartInfo(
+            id=chart_option,
+            type=None,
+            type_for_from='',
+            title=None,
+            menu=None,
+            chart=self.playlist(0, self.tracks_of(0)),
+        )
+
+    def search(self, text, type_='all', page=0):
+        self.record('search')
+        tracks = self.tracks_of(page)
+
+        def result(type_, results):
+            return SearchResult(type=type_, total=len(results), per_page=len(results), order=0, results=results)
+
+        return Search(
+            search_request_id='',
+            text=text,
+            best=None,
+            albums=result('album', [track.albums[0] for track in tracks[::10]]),
+            artists=result('artist', [self.artist(index) for index in range(min(self.size, ARTISTS))]),
+            playlists=None,
+            tracks=result('track', tracks),
+            videos=None,
+            users=None,
+            podcasts=None,
+            podcast_episodes=None,
+        )
+
+    def tracks_download_info(self, track_id, get_direct_links=False):
+        self.record('tracks_download_info')
+        infos = []
+        for codec, bitrate in (('mp3', 128), ('mp3', 192), ('mp3', 320), ('aac', 64), ('aac', 192)):
+            info = DownloadInfo(
+                codec=codec,
+                bitrate_in_kbps=bitrate,
+                gain=False,
+                preview=False,
+                download_info_url='',
+                direct=False,
+            )
+            info.get_direct_link = lambda track_id=track_id, info=info: self._direct_link(track_id, info)
+            infos.append(info)
+        return infos
+
+    def _direct_link(self, track_id, info):
+        self.record('get_direct_link')
+        return f'https://storage.example/{track_id}/{info.bitrate_in_kbps}.{info.codec}'
+
+    def users_likes_tracks(self, if_modified_since_revision=0):
+        self.record('users_likes_tracks')
+        shorts = [TrackShort(id=str(index), timestamp='') for index in range(self.size)]
+        return TracksList(uid=USER_ID, revision=1, tracks=shorts)
+
+    def users_playlists_list(self):
+        self.record('users_playlists_list')
+        return [self.playlist(kind, []) for kind in range(1, 4)]
+
+    def users_likes_albums(self):
+        self.record('users_likes_albums')
+        return [Like(type='album', album=self.album(index)) for index in range(min(self.size, ARTISTS))]
+
+    def rotor_station_tracks(self, station, settings2=True, queue=None):
+        self.record('rotor_station_tracks')
+        start = int(queue) + 1 if queue else 0
+        tracks = [self.track(index) for index in range(start, start + RADIO_BATCH)]
+        return StationTracksResult(
+            id=None,
+            sequence=[Sequence(type='track', track=track, liked=False) for track in tracks],
+            batch_id=f'batch-{start}',
+            pumpkin=False,
+        )
+
+    def rotor_station_feedback(self, station, type_, timestamp=None, from_=None, batch_id=None,
+                               total_played_seconds=None, track_id=None):
+        self.record('rotor_station_feedback')
+        return True
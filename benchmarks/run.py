@@ -0,0 +1,118 @@
+"""Offline benchmarks of the backend hot paths.
+
+Runs every operation against :class:`~benchmarks.fake.FakeClient` and
+reports wall time, API calls and peak memory::
+
+    python -m benchmarks.run --size 100 1000 --latency 0.05 --jitter 0.02
+"""
+import argparse
+import configparser
+import json
+import time
+import tracemalloc
+
+from mopidy_ymusic import Extension
+from mopidy_ymusic.backend import YMusicBackend
+from mopidy_ymusic.client import SingleFlightClient
+from .fake import FakeClient
+
+
+def default_config(**overrides):
+    parser = configparser.RawConfigParser()
+    parser.read_string(Extension().get_default_config())
+    raw = {**parser['ymusic'], 'token': 'benchmark'}
+    del raw['enabled']
+    schema = Extension().get_config_schema()
+    config = {key: schema[key].deserialize(value) for key, value in raw.items()}
+    config.update(metadata_store=False, audio_cache_size=0, image_cache_size=0, **overrides)
+    return {'ymusic': config}
+
+
+def operations(size):
+    """``(name, callable)`` pairs taking a backend, each exercising one provider method."""
+    uris = [f'ymusic:track:{index}' for index in range(size)]
+    return [
+        ('library.browse root', lambda backend: backend.library.browse(backend.library.root_directory.uri)),
+        ('library.browse album', lambda backend: backend.library.browse('ymusic:album:1')),
+        ('library.browse artist', lambda backend: backend.library.browse('ymusic:artist:1')),
+        ('library.lookup album', lambda backend: backend.library.lookup('ymusic:album:1')),
+        ('library.lookup_many tracks', lambda backend: backend.library.lookup_many(uris)),
+        ('library.search', lambda backend: backend.library.search({'any': ['track'], 'artist': ['artist']}, None)),
+        ('library.get_images', lambda backend: backend.library.get_images(
+            [*uris[:50], 'ymusic:album:1', 'ymusic:artist:1', 'ymusic:playlist:world'],
+        )),
+        ('playlists.get_items chart', lambda backend: backend.playlists.get_items('ymusic:playlist:world')),
+        ('playlists.lookup chart', lambda backend: backend.playlists.lookup('ymusic:playlist:world')),
+        ('playlists.as_list', lambda backend: backend.playlists.as_list()),
+        ('playback.translate_uri', lambda backend: backend.playback.translate_uri(uris[0])),
+    ]
+
+
+def create_backend(config, client):
+    backend = YMusicBackend(config, None)
+    backend.client = SingleFlightClient(client, metrics=backend.metrics)
+    return backend
+
+
+def measure(config, size, latency, jitter, name, operation):
+    """Run ``operation`` on a fresh backend twice, cold and warm, then once more tracing memory."""
+    client = FakeClient(size=size, latency=latency, jitter=jitter)
+    backend = create_backend(config, client)
+    try:
+        started = time.perf_counter()
+        operation(backend)
+        cold = time.perf_counter() - started
+        calls = sum(client.calls.values())
+        started = time.perf_counter()
+        operation(backend)
+        warm = time.perf_counter() - started
+        warm_calls = sum(client.calls.values()) - calls
+    finally:
+        backend.executor.shutdown()
+
+    backend = create_backend(config, FakeClient(size=size))
+    tracemalloc.start()
+    try:
+        operation(backend)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        backend.executor.shutdown()
+
+    return {
+        'operation': name,
+        'size': size,
+        'cold_ms': round(cold * 1000, 1),
+        'warm_ms': round(warm * 1000, 1),
+        'calls': calls,
+        'warm_calls': warm_calls,
+        'peak_kib': round(peak / 1024),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, nargs='+', default=[100, 1000], help='tracks per album, chart or page')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every API call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='seconds the latency varies either way')
+    parser.add_argument('--filter', default='', help='run only operations containing this text')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    args = parser.parse_args(argv)
+
+    config = default_config()
+    columns = ('operation', 'size', 'cold_ms', 'warm_ms', 'calls', 'warm_calls', 'peak_kib')
+    if not args.json:
+        print(f'{columns[0]:<28}' + ''.join(f'{column:>12}' for column in columns[1:]))
+    for size in args.size:
+        for name, operation in operations(size):
+            if args.filter not in name:
+                continue
+            result = measure(config, size, args.latency, args.jitter, name, operation)
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(f'{result["operation"]:<28}' + ''.join(f'{result[column]:>12}' for column in columns[1:]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""Local stand-in for the Yandex Music API.
+
+Answers the endpoints the extension uses with the synthetic data of
+:class:`~benchmarks.fake.FakeClient` and serves a generated tone for every
+direct link, so a whole Mopidy instance can be load-tested offline::
+
+    python -m benchmarks.server --port 8080 --size 100 --latency 0.05
+
+with the backend pointed at it::
+
+    [ymusic]
+    token = standin
+    base_url = http://127.0.0.1:8080
+"""
+import argparse
+import io
+import json
+import math
+import re
+import struct
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .fake import USER_ID, FakeClient
+
+
+SAMPLE_RATE = 8000
+TONE_HZ = 440
+
+
+def tone(seconds):
+    """WAV file of a sine tone lasting ``seconds``."""
+    samples = (
+        int(8000 * math.sin(2 * math.pi * TONE_HZ * index / SAMPLE_RATE))
+        for index in range(int(seconds * SAMPLE_RATE))
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(SAMPLE_RATE)
+        file.writeframes(b''.join(struct.pack('<h', sample) for sample in samples))
+    return buffer.getvalue()
+
+
+def dump(obj):
+    if isinstance(obj, list):
+        return [dump(item) for item in obj]
+    return obj.to_dict()
+
+
+def ids(values):
+    return [item for value in values for item in value.split(',') if item]
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fake, audio_seconds):
+        super().__init__(address, StandInHandler)
+        self.fake = fake
+        self.audio = tone(audio_seconds)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Routes requests to :class:`~benchmarks.fake.FakeClient` and wraps the results like the API does."""
+
+    #: ``(HTTP method, path pattern, handler method name)``
+    routes = [
+        ('GET', r'/account/status', 'account_status'),
+        ('GET', r'/feed', 'feed'),
+        ('GET', r'/landing3/chart(?:/(?P<option>[^/]+))?', 'chart'),
+        ('POST', r'/tracks', 'tracks'),
+        ('POST', r'/albums', 'albums'),
+        ('POST', r'/artists', 'artists'),
+        ('GET', r'/albums/(?P<album_id>[^/]+)/with-tracks', 'albums_with_tracks'),
+        ('GET', r'/artists/(?P<artist_id>[^/]+)/tracks', 'artists_tracks'),
+        ('GET', r'/search', 'search'),
+        ('POST', r'/playlists/list', 'playlists_list'),
+        ('GET', r'/tracks/(?P<track_id>[^/]+)/download-info', 'tracks_download_info'),
+        ('GET', r'/download-info/(?P<path>.+)', 'download_info_xml'),
+        ('GET', r'/get-mp3/[^/]+/[^/]+/audio/.+', 'audio'),
+        ('GET', r'/users/[^/]+/likes/tracks', 'users_likes_tracks'),
+        ('GET', r'/users/[^/]+/likes/albums', 'users_likes_albums'),
+        ('GET', r'/users/[^/]+/playlists/list', 'users_playlists_list'),
+        ('GET', r'/rotor/station/(?P<station>[^/]+)/tracks', 'rotor_station_tracks'),
+        ('POST', r'/rotor/station/(?P<station>[^/]+)/feedback', 'rotor_station_feedback'),
+    ]
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def _route(self, method):
+        url = urlsplit(self.path)
+        self.params = parse_qs(url.query)
+        self.json = None
+        if method == 'POST':
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                self.json = json.loads(body)
+            else:
+                self.params.update(parse_qs(body.decode()))
+        for route_method, pattern, name in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                getattr(self, name)(**{key: value for key, value in match.groupdict().items() if value})
+                return
+        self._send(404, json.dumps({'error': 'not-found', 'error_description': url.path}).encode())
+
+    def _param(self, name, default=None):
+        return self.params.get(name, [default])[0]
+
+    def _send(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _result(self, result):
+        self._send(200, json.dumps({'result': result}).encode())
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def account_status(self):
+        self._result({
+            'account': {'now': '', 'service_available': True, 'uid': USER_ID, 'login': 'user'},
+            'permissions': {'until': '', 'values': [], 'default': []},
+        })
+
+    def feed(self):
+        self._result(dump(self.fake.feed()))
+
+    def chart(self, option=''):
+        self._result(dump(self.fake.chart(option)))
+
+    def tracks(self):
+        self._result(dump(self.fake.tracks(ids(self.params.get('track-ids', [])))))
+
+    def albums(self):
+        self._result(dump(self.fake.albums(ids(self.params.get('album-ids', [])))))
+
+    def artists(self):
+        self._result(dump(self.fake.artists(ids(self.params.get('artist-ids', [])))))
+
+    def albums_with_tracks(self, album_id):
+        self._result(dump(self.fake.albums_with_tracks(album_id)))
+
+    def artists_tracks(self, artist_id):
+        page, page_size = int(self._param('page', 0)), int(self._param('page-size', 20))
+        self._result(dump(self.fake.artists_tracks(artist_id, page=page, page_size=page_size)))
+
+    def search(self):
+        text, type_, page = self._param('text', ''), self._param('type', 'all'), int(self._param('page', 0))
+        self._result(dump(self.fake.search(text, type_=type_, page=page)))
+
+    def playlists_list(self):
+        self._result(dump(self.fake.playlists_list(ids(self.params.get('playlist-ids', [])))))
+
+    def tracks_download_info(self, track_id):
+        host = self.headers['Host']
+        self._result([
+            {
+                'codec': info.codec,
+                'bitrate_in_kbps': info.bitrate_in_kbps,
+                'gain': False,
+                'preview': False,
+                'download_info_url': f'http://{host}/download-info/{track_id}/{info.bitrate_in_kbps}.{info.codec}',
+                'direct': False,
+            }
+            for info in self.fake.tracks_download_info(track_id)
+        ])
+
+    def download_info_xml(self, path):
+        self.fake.record('get_direct_link')
+        xml = (
+            f'<?xml version="1.0" encoding="utf-8"?><download-info><host>{self.headers["Host"]}</host>'
+            f'<path>/audio/{path}</path><ts>{int(time.time()):x}</ts><s>standin</s></download-info>'
+        )
+        self._send(200, xml.encode(), 'text/xml')
+
+    def audio(self):
+        self._send(200, self.server.audio, 'audio/x-wav')
+
+    def users_likes_tracks(self):
+        self._result({'library': dump(self.fake.users_likes_tracks())})
+
+    def users_likes_albums(self):
+        self._result(dump(self.fake.users_likes_albums()))
+
+    def users_playlists_list(self):
+        self._result(dump(self.fake.users_playlists_list()))
+
+    def rotor_station_tracks(self, station):
+        self._result(dump(self.fake.rotor_station_tracks(station, queue=self._param('queue'))))
+
+    def rotor_station_feedback(self, station):
+        self.fake.rotor_station_feedback(
+            station,
+            type_=self.json['type'],
+            timestamp=self.json['timestamp'],
+            from_=self.json.get('from'),
+            batch_id=self._param('batch-id'),
+            total_played_seconds=self.json.get('totalPlayedSeconds'),
+            track_id=self.json.get('trackId'),
+        )
+        self._result('ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    parser.add_argument('--size', type=int, default=100, help='tracks per album, chart or page')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every API call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='seconds the latency varies either way')
+    parser.add_argument('--audio-seconds', type=float, default=10, help='length of the served audio')
+    args = parser.parse_args(argv)
+
+    fake = FakeClient(size=args.size, latency=args.latency, jitter=args.jitter)
+    server = StandInServer((args.host, args.port), fake, args.audio_seconds)
+    print(f'Serving a stand-in Yandex Music API at http://{args.host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(', '.join(f'{method}: {count}' for method, count in sorted(fake.calls.items())))
+
+
+if __name__ == '__main__':
+    main()
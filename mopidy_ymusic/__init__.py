@@ -3,8 +3,6 @@ from pathlib import Path
 
 from mopidy import config, ext
 
-from .backend import YMusicBackend
-
 
 __version__ = '0.0.1'
 
@@ -22,8 +20,52 @@ class Extension(ext.Extension):
     def get_config_schema(self):
         schema = super().get_config_schema()
         schema['token'] = config.String()
+        schema['base_url'] = config.String(optional=True)
         schema['bitrate'] = config.Integer()
+        schema['codecs'] = config.List()
+        schema['link_ttl'] = config.Integer(minimum=0)
+        schema['audio_cache_size'] = config.Integer(minimum=0)
+        schema['prefetch_count'] = config.Integer(minimum=0)
+        schema['cache_ttl'] = config.List(
+            subtype=config.Pair(separator=':', subtypes=(config.String(), config.Integer(minimum=0))),
+        )
+        schema['cache_size'] = config.Integer(minimum=1)
+        schema['metadata_store'] = config.Boolean()
+        schema['metadata_store_ttl'] = config.Integer(minimum=0)
+        schema['metadata_store_size'] = config.Integer(minimum=0)
+        schema['image_size'] = config.String()
+        schema['image_cache_size'] = config.Integer(minimum=0)
+        schema['image_cache_sizes'] = config.List()
+        schema['charts'] = config.List()
+        schema['browse_page_size'] = config.Integer(minimum=1)
+        schema['artist_tracks_limit'] = config.Integer(minimum=1)
+        schema['user_library'] = config.Boolean()
+        schema['search_remote'] = config.Boolean()
+        schema['search_remote_wait'] = config.Boolean()
+        schema['search_pages'] = config.Integer(minimum=1)
+        schema['search_cache_ttl'] = config.Integer(minimum=0)
+        schema['search_cache_size'] = config.Integer(minimum=1)
+        schema['radio_station'] = config.String(optional=True)
+        schema['radio_buffer'] = config.Integer(minimum=1)
+        schema['warmup_interval'] = config.Integer(minimum=0)
+        schema['warmup_jitter'] = config.Integer(minimum=0)
+        schema['warmup_workers'] = config.Integer(minimum=1)
+        schema['init_timeout'] = config.Float(minimum=0)
+        schema['workers'] = config.Integer(minimum=1)
+        schema['pool_size'] = config.Integer(minimum=1)
+        schema['connect_timeout'] = config.Float(minimum=0)
+        schema['read_timeout'] = config.Float(minimum=0)
+        schema['retries'] = config.Integer(minimum=0)
+        schema['retry_backoff'] = config.Float(minimum=0)
+        schema['priorities'] = config.List(
+            subtype=config.Pair(separator=':', subtypes=(config.String(), config.Integer(minimum=0))),
+        )
+        schema['metrics_interval'] = config.Integer(minimum=0)
         return schema
 
     def setup(self, registry):
+        from .backend import YMusicBackend
         registry.add('backend', YMusicBackend)
+
+        from .web import factory
+        registry.add('http:app', {'name': self.ext_name, 'factory': factory})
@@ -1,23 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from mopidy.backend import Backend
 from pykka import ThreadingActor
+from pykka.messages import ProxyCall
 from yandex_music import Client
 
+from .cache import MetadataCache
+from .client import LazyClient, PooledRequest, SingleFlightClient
+from .dispatch import DispatchingInbox, PriorityExecutor
+from .files import FileCache
+from .index import SearchIndex
 from .library import YMusicLibraryProvider
+from .metrics import Metrics, publish
 from .playback import YMusicPlaybackProvider
 from .playlist import YMusicPlaylistsProvider
+from .radio import Radio
+from .store import MetadataStore
+from .sync import LibrarySync
+from .warmup import WarmUp
+
+
+#: Dispatched calls answered together by the call they map to, see :class:`DispatchingInbox`.
+BATCHED_CALLS = {'library.lookup': 'library.lookup_many'}
 
 
 class YMusicBackend(ThreadingActor, Backend):
     uri_schemes = ['ymusic']
 
+    @staticmethod
+    def _create_actor_inbox():
+        return DispatchingInbox()
+
     def __init__(self, config, audio):
         super().__init__()
+        self.config = config
         self.audio = audio
+        self.metrics = Metrics()
+        self.cache = MetadataCache(
+            ttls=config['ymusic']['cache_ttl'],
+            maxsize=config['ymusic']['cache_size'],
+            store=self._get_metadata_store(config),
+        )
+        self.index = self._get_search_index(config)
         self.library = YMusicLibraryProvider(self)
         self.playback = YMusicPlaybackProvider(audio, self)
         self.playlists = YMusicPlaylistsProvider(self)
-        self.client = Client(config['ymusic']['token'])
-        self.config = config
+        self.sync = LibrarySync(self)
+        self.radio = Radio(self)
+        self.warm_up = WarmUp(self)
+        self.metrics.register_cache('metadata', self.cache.stats)
+        self.metrics.register_cache('search', lambda: {'page': self.library.search_cache.stats()})
+        self.metrics.register_cache('links', lambda: {'link': self.playback.links.stats()})
+        self.request = PooledRequest(
+            pool_size=config['ymusic']['pool_size'],
+            connect_timeout=config['ymusic']['connect_timeout'],
+            read_timeout=config['ymusic']['read_timeout'],
+            retries=config['ymusic']['retries'],
+            backoff=config['ymusic']['retry_backoff'],
+        )
+        self.audio_cache = self._get_file_cache(config, self.request, 'audio')
+        self.image_cache = self._get_file_cache(config, self.request, 'image')
+        self.client = LazyClient(self._create_client, timeout=config['ymusic']['init_timeout'])
+        self.executor = ThreadPoolExecutor(max_workers=config['ymusic']['workers'], thread_name_prefix='YMusicFetch')
+        self.dispatcher = PriorityExecutor(workers=config['ymusic']['workers'])
+
+    @staticmethod
+    def _get_metadata_store(config):
+        if not config['ymusic']['metadata_store']:
+            return None
+
+        from . import Extension
+        return MetadataStore(
+            Extension.get_cache_dir(config) / 'metadata.sqlite3',
+            ttl=config['ymusic']['metadata_store_ttl'],
+            maxsize=config['ymusic']['metadata_store_size'],
+        )
+
+    @staticmethod
+    def _get_search_index(config):
+        if not config['ymusic']['metadata_store']:
+            return SearchIndex()
+
+        from . import Extension
+        return SearchIndex(Extension.get_cache_dir(config) / 'search.sqlite3')
+
+    @staticmethod
+    def _get_file_cache(config, request, kind):
+        """The ``audio`` or ``image`` file cache, :obj:`None` when its ``<kind>_cache_size`` is 0."""
+        size = config['ymusic'][f'{kind}_cache_size']
+        if not size:
+            return None
+
+        from . import Extension
+        return FileCache(
+            Extension.get_cache_dir(config) / kind,
+            max_bytes=size * 1024 * 1024,
+            session=request.session,
+            timeout=request.timeout,
+        )
+
+    def _create_client(self):
+        config = self.config['ymusic']
+        client = Client(config['token'], base_url=config['base_url'], request=self.request)
+        return SingleFlightClient(client.init(), metrics=self.metrics)
+
+    def _handle_receive(self, message):
+        if not isinstance(message, ProxyCall):
+            return super()._handle_receive(message)
+        with self.metrics.timer('call', '.'.join(message.attr_path)):
+            return super()._handle_receive(message)
 
     def on_start(self):
-        self.client.init()
+        self.client.start()
+        self.playback.prefetcher.start()
+        self.dispatcher.start()
+        self.actor_inbox.start_dispatch(
+            self, self.dispatcher, self.config['ymusic']['priorities'], self.metrics, BATCHED_CALLS,
+        )
+        self.metrics.start(self.config['ymusic']['metrics_interval'])
+        publish(self.metrics)
+        self.radio.start()
+        self.warm_up.start()
+
+    def on_stop(self):
+        publish(None)
+        self.metrics.stop()
+        self.radio.stop()
+        self.warm_up.stop()
+        self.actor_inbox.stop_dispatch()
+        self.dispatcher.shutdown()
+        self.playback.prefetcher.stop()
+        self.executor.shutdown(wait=False)
+        self.cache.close()
+        self.index.close()
+        for file_cache in (self.audio_cache, self.image_cache):
+            if file_cache is not None:
+                file_cache.close()
+        self.request.close()
@@ -0,0 +1,188 @@
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TTL = 3600
+REVALIDATE_WORKERS = 2
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire after ``ttl`` seconds.
+
+    When ``maxsize`` is set, the least recently used entries are evicted once
+    the cache holds more than ``maxsize`` entries.
+    """
+
+    def __init__(self, ttl, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class MetadataCache:
+    """Backend-wide cache of converted API results.
+
+    Entries are grouped by entity kind (``feed``, ``album``, ``chart``...),
+    every kind has its own time to live. A single result may be cached per
+    operation (``browse``, ``lookup``...) for the same URI.
+
+    With a :class:`~mopidy_ymusic.store.MetadataStore` entries also survive
+    restarts. Stale stored entries are served as is and reloaded in the
+    background.
+    """
+
+    def __init__(self, ttls, maxsize, store=None):
+        self.ttls = dict(ttls)
+        self.store = store
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self._entries = TTLCache(ttl=DEFAULT_TTL, maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._revalidating = set()
+        self._executor = None
+
+    def get(self, kind, uri, op=None):
+        value, stale = self._get(kind, uri, op)
+        return None if stale else value
+
+    def set(self, kind, uri, value, op=None):
+        self._entries.set((kind, uri, op), value, ttl=self.ttls.get(kind, DEFAULT_TTL))
+        if self.store is not None:
+            self.store.set(kind, uri, value, op)
+
+    def get_or_load(self, kind, uri, loader, op=None):
+        value, stale = self._get(kind, uri, op)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(kind, uri, value, op)
+        elif stale:
+            self._revalidate(kind, uri, loader, op)
+        return value
+
+    def _get(self, kind, uri, op):
+        key = (kind, uri, op)
+        value = self._entries.get(key)
+        stale = False
+        if value is None and self.store is not None:
+            stored = self.store.get(kind, uri, op)
+            if stored is not None:
+                value, updated_at = stored
+                ttl = self.ttls.get(kind, DEFAULT_TTL)
+                age = time.time() - updated_at
+                stale = age >= ttl
+                if not stale:
+                    self._entries.set(key, value, ttl=ttl - age)
+
+        counter = self.misses if value is None else self.hits
+        counter[kind] += 1
+        return value, stale
+
+    def _revalidate(self, kind, uri, loader, op):
+        key = (kind, uri, op)
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=REVALIDATE_WORKERS,
+                    thread_name_prefix='YMusicRevalidate',
+                )
+        self._executor.submit(self._reload, key, loader)
+
+    def _reload(self, key, loader):
+        kind, uri, op = key
+        try:
+            value = loader()
+            if value is not None:
+                self.set(kind, uri, value, op)
+        except Exception:
+            logger.exception(f'Failed to revalidate {uri}')
+        finally:
+            with self._lock:
+                self._revalidating.discard(key)
+
+    def invalidate(self, kind=None, uri=None):
+        """Drop the entries matching the given kind and/or URI, all of them by default."""
+        if self.store is not None:
+            self.store.invalidate(kind, uri)
+        if kind is None and uri is None:
+            self._entries.clear()
+            return
+
+        for key in self._entries.keys():
+            entry_kind, entry_uri, _ = key
+            if kind not in (None, entry_kind) or uri not in (None, entry_uri):
+                continue
+            self._entries.pop(key)
+
+    def stats(self):
+        return {
+            kind: {'hits': self.hits[kind], 'misses': self.misses[kind]}
+            for kind in sorted(set(self.hits) | set(self.misses))
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self.store is not None:
+            self.store.close()
+
+    def __len__(self):
+        return len(self._entries)
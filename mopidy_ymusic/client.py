@@ -0,0 +1,189 @@
+import logging
+import threading
+
+import requests
+from mopidy.exceptions import BackendError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from yandex_music.exceptions import (
+    BadRequestError,
+    NetworkError,
+    NotFoundError,
+    TimedOutError,
+    UnauthorizedError,
+    YandexMusicError,
+)
+from yandex_music.utils.request import USER_AGENT, Request
+
+
+logger = logging.getLogger(__name__)
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlightClient:
+    """Wraps a yandex_music ``Client`` so that identical concurrent calls share one request.
+
+    A call made while another one with the same method and arguments is in
+    flight waits for it and gets the same result or exception. When
+    ``metrics`` are given, the calls actually sent are timed there.
+    """
+
+    def __init__(self, client, metrics=None):
+        self._client = client
+        self._metrics = metrics
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._call(name, attr, args, kwargs)
+
+        return call
+
+    def _call(self, name, method, args, kwargs):
+        key = (name, repr(args), repr(sorted(kwargs.items())))
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            return flight.wait()
+
+        try:
+            if self._metrics is None:
+                flight.result = method(*args, **kwargs)
+            else:
+                flight.result = self._metrics.call_api(name, method, *args, **kwargs)
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+
+class PooledRequest(Request):
+    """yandex_music request sender keeping connections alive in a shared pool.
+
+    Every request uses the configured ``(connect, read)`` timeouts. Failed
+    connections and transient server errors are retried with exponential
+    backoff, the latter only for idempotent methods, so a POST such as radio
+    feedback is never sent twice.
+    """
+
+    def __init__(self, pool_size, connect_timeout, read_timeout, retries, backoff, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _request_wrapper(self, *args, **kwargs):
+        kwargs['headers'] = {**kwargs.get('headers', {}), 'User-Agent': USER_AGENT}
+        kwargs['timeout'] = self.timeout
+
+        try:
+            resp = self.session.request(*args, **kwargs)
+        except requests.Timeout:
+            raise TimedOutError()
+        except requests.RequestException as e:
+            raise NetworkError(e)
+
+        if 200 <= resp.status_code <= 299:
+            return resp.content
+
+        try:
+            message = self._parse(resp.content).get_error()
+        except YandexMusicError:
+            message = 'Unknown HTTPError'
+
+        if resp.status_code in (401, 403):
+            raise UnauthorizedError(message)
+        if resp.status_code == 400:
+            raise BadRequestError(message)
+        if resp.status_code == 404:
+            raise NotFoundError(message)
+        raise NetworkError(f'{message} ({resp.status_code}): {resp.content}')
+
+    def close(self):
+        self.session.close()
+
+
+class LazyClient:
+    """Client built and initialized on a background thread.
+
+    Attribute access waits up to ``timeout`` seconds for the client to become
+    ready and raises :class:`~mopidy.exceptions.BackendError` otherwise. A
+    failed initialization is retried on the next access. Private names, like
+    the ones pykka probes when building an actor proxy, never wait.
+    """
+
+    pykka_traversable = False
+    _pykka_traversable = False
+
+    def __init__(self, factory, timeout):
+        self.factory = factory
+        self.timeout = timeout
+        self.ready = threading.Event()
+        self._client = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._client is not None or (self._thread is not None and self._thread.is_alive()):
+                return
+            self.ready.clear()
+            self._thread = threading.Thread(target=self._init, name='YMusicClientInit', daemon=True)
+            self._thread.start()
+
+    def _init(self):
+        try:
+            self._client = self.factory()
+            logger.info('Yandex Music client is ready')
+        except Exception:
+            logger.exception('Failed to initialize Yandex Music client')
+        finally:
+            self.ready.set()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._client is None:
+            self.start()
+            self.ready.wait(self.timeout)
+        if self._client is None:
+            raise BackendError('Yandex Music client is not ready')
+        return getattr(self._client, name)
@@ -0,0 +1,179 @@
+import functools
+import itertools
+import logging
+import math
+import queue
+import threading
+import time
+
+from pykka.messages import ProxyCall
+
+
+logger = logging.getLogger(__name__)
+
+
+URGENT_PRIORITY = 0
+BATCH_WINDOW = 0.005
+
+
+class PriorityExecutor:
+    """Thread pool running callables in priority order, lower values first.
+
+    Callables with ``URGENT_PRIORITY`` run on a dedicated thread, so they never
+    queue behind the rest of the work.
+    """
+
+    def __init__(self, workers, name='YMusicWorker'):
+        self.workers = workers
+        self.name = name
+        self._queue = queue.PriorityQueue()
+        self._urgent = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        lanes = [(self._urgent, f'{self.name}-urgent')]
+        lanes.extend((self._queue, f'{self.name}-{index}') for index in range(self.workers))
+        for tasks, name in lanes:
+            thread = threading.Thread(target=self._run, args=(tasks,), name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, priority, fn, *args, **kwargs):
+        tasks = self._urgent if priority <= URGENT_PRIORITY else self._queue
+        tasks.put((priority, next(self._counter), functools.partial(fn, *args, **kwargs)))
+
+    def shutdown(self):
+        for _ in range(self.workers):
+            self._queue.put((math.inf, next(self._counter), None))
+        self._urgent.put((math.inf, next(self._counter), None))
+        self._threads = []
+
+    @staticmethod
+    def _run(tasks):
+        while True:
+            _, _, fn = tasks.get()
+            if fn is None:
+                return
+            try:
+                fn()
+            except Exception:
+                logger.exception('Unhandled error in worker')
+
+
+class DispatchingInbox(queue.Queue):
+    """Actor inbox that hands selected proxy calls to a :class:`PriorityExecutor`.
+
+    Calls are matched by their dotted attribute path (``library.browse``).
+    Everything else, including calls made before :meth:`start_dispatch`, is
+    processed by the actor thread as usual. Once ``metrics`` are given, the
+    time calls wait in either queue and the duration of dispatched calls are
+    recorded there.
+
+    ``batches`` maps a dispatched single-argument call to one taking a list
+    of those arguments and returning a dict keyed by them, like
+    ``library.lookup`` to ``library.lookup_many``. Such calls arriving within
+    ``BATCH_WINDOW`` seconds of each other are answered by a single call.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.actor = None
+        self.executor = None
+        self.metrics = None
+        self.priorities = {}
+        self.batches = {}
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+    def start_dispatch(self, actor, executor, priorities, metrics=None, batches=None):
+        self.actor = actor
+        self.priorities = dict(priorities)
+        self.batches = dict(batches or {})
+        self.metrics = metrics
+        self.executor = executor
+
+    def stop_dispatch(self):
+        self.executor = None
+
+    def put(self, item, block=True, timeout=None):
+        executor = self.executor
+        if executor is not None and isinstance(item.message, ProxyCall):
+            path = '.'.join(item.message.attr_path)
+            priority = self.priorities.get(path)
+            if priority is not None and path in self.batches and self._batchable(item.message):
+                self._add_to_batch(executor, priority, path, item)
+                return
+            if priority is not None:
+                executor.submit(priority, self._call, item, time.monotonic())
+                return
+        super().put(item, block, timeout)
+
+    def _put(self, item):
+        super()._put((time.monotonic(), item))
+
+    def _get(self):
+        queued, item = super()._get()
+        self._observe('queue', item.message, time.monotonic() - queued)
+        return item
+
+    def _observe(self, kind, message, value):
+        if self.metrics is not None and isinstance(message, ProxyCall):
+            self.metrics.observe(kind, '.'.join(message.attr_path), value)
+
+    @staticmethod
+    def _batchable(message):
+        return len(message.args) == 1 and not message.kwargs
+
+    def _add_to_batch(self, executor, priority, path, envelope):
+        with self._pending_lock:
+            batch = self._pending.setdefault(path, [])
+            batch.append((envelope, time.monotonic()))
+            first = len(batch) == 1
+        if first:
+            executor.submit(priority, self._call_batch, path)
+
+    def _call_batch(self, path):
+        time.sleep(BATCH_WINDOW)
+        with self._pending_lock:
+            batch = self._pending.pop(path)
+        started = time.monotonic()
+        for envelope, queued in batch:
+            self._observe('queue', envelope.message, started - queued)
+
+        target = self.batches[path]
+        try:
+            callee = functools.reduce(getattr, target.split('.'), self.actor)
+            results = callee([envelope.message.args[0] for envelope, _ in batch])
+        except Exception:
+            for envelope, _ in batch:
+                if envelope.reply_to is not None:
+                    envelope.reply_to.set_exception()
+            if any(envelope.reply_to is None for envelope, _ in batch):
+                raise
+        else:
+            for envelope, _ in batch:
+                if envelope.reply_to is not None:
+                    envelope.reply_to.set(results[envelope.message.args[0]])
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe('call', target, time.monotonic() - started)
+
+    def _call(self, envelope, queued):
+        message = envelope.message
+        started = time.monotonic()
+        self._observe('queue', message, started - queued)
+        try:
+            callee = functools.reduce(getattr, message.attr_path, self.actor)
+            result = callee(*message.args, **message.kwargs)
+        except Exception:
+            if envelope.reply_to is None:
+                raise
+            envelope.reply_to.set_exception()
+        else:
+            if envelope.reply_to is not None:
+                envelope.reply_to.set(result)
+        finally:
+            self._observe('call', message, time.monotonic() - started)
@@ -0,0 +1,118 @@
+import collections
+import logging
+import os
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+CHUNK_SIZE = 64 * 1024
+DOWNLOAD_WORKERS = 2
+PARTIAL_SUFFIX = '.part'
+
+
+def remove(path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class FileCache:
+    """Directory of downloaded files holding at most ``max_bytes``.
+
+    Files are downloaded in the background and become available once
+    complete. The least recently used files are evicted first, the order
+    survives restarts through the files' modification times.
+    """
+
+    def __init__(self, path, max_bytes, session, timeout):
+        self.path = pathlib.Path(path)
+        self.max_bytes = max_bytes
+        self.session = session
+        self.timeout = timeout
+        self.size = 0
+        self._files = collections.OrderedDict()
+        self._downloading = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._scan()
+
+    def _scan(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.path.iterdir():
+            if path.suffix == PARTIAL_SUFFIX:
+                path.unlink()
+            elif path.is_file():
+                stat = path.stat()
+                files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._files[name] = size
+            self.size += size
+        self._evict()
+
+    def get(self, name):
+        """Path of the cached file or :obj:`None`."""
+        with self._lock:
+            if name not in self._files:
+                return None
+            self._files.move_to_end(name)
+        path = self.path / name
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._files.pop(name, 0)
+            return None
+        return path
+
+    def download(self, name, url):
+        """Download ``url`` as ``name`` in the background, unless it is cached or being downloaded."""
+        with self._lock:
+            if name in self._files or name in self._downloading:
+                return
+            self._downloading.add(name)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix='YMusicDownload')
+        self._executor.submit(self._download, name, url)
+
+    def _download(self, name, url):
+        path = self.path / name
+        partial = path.with_name(name + PARTIAL_SUFFIX)
+        try:
+            with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                with open(partial, 'wb') as file:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        file.write(chunk)
+            os.replace(partial, path)
+            size = path.stat().st_size
+            with self._lock:
+                self._files[name] = size
+                self.size += size
+                self._evict()
+            logger.info(f'Cached {name} ({size} bytes), {self.path} holds {self.size} bytes')
+        except Exception as e:
+            logger.warning(f'Failed to cache {name}: {e}')
+            remove(partial)
+        finally:
+            with self._lock:
+                self._downloading.discard(name)
+
+    def _evict(self):
+        while self._files and self.size > self.max_bytes:
+            name, size = self._files.popitem(last=False)
+            self.size -= size
+            remove(self.path / name)
+            logger.debug(f'Evicted {name} from {self.path}')
+
+    def __len__(self):
+        return len(self._files)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
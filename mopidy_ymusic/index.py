@@ -0,0 +1,211 @@
+import json
+import logging
+import sqlite3
+import threading
+
+from mopidy.models import Album, Artist, ModelJSONEncoder, SearchResult, Track, model_json_decoder
+
+from .store import FLUSH_INTERVAL, FLUSH_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA_VERSION = 1
+SEARCH_LIMIT = 50
+
+FIELD_COLUMNS = {
+    'any': ('name', 'artist', 'album'),
+    'artist': ('artist',),
+    'albumartist': ('artist',),
+    'album': ('album',),
+    'track': ('name',),
+    'track_name': ('name',),
+}
+TYPES = {Track: 'track', Album: 'album', Artist: 'artist'}
+
+
+def quote(token):
+    return '"' + token.replace('"', '""') + '"'
+
+
+def index_columns(model):
+    """``(name, artist, album)`` text indexed for ``model``."""
+    if isinstance(model, Track):
+        return (
+            model.name or '',
+            ' '.join(artist.name or '' for artist in model.artists),
+            (model.album.name or '') if model.album else '',
+        )
+    if isinstance(model, Album):
+        return model.name or '', ' '.join(artist.name or '' for artist in model.artists), model.name or ''
+    return model.name or '', model.name or '', ''
+
+
+class SearchIndex:
+    """SQLite full-text index of the tracks, albums and artists seen by the backend.
+
+    Models are added as they are converted. Adding a model again only
+    rewrites its index entry when it changed. Non-exact queries match
+    prefixes of the words in the query, exact ones match whole field values
+    case-insensitively.
+
+    Added models are written by a background thread in one transaction, like
+    the writes of :class:`~mopidy_ymusic.store.MetadataStore`. Searches write
+    the waiting ones first.
+    """
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.create_function('casefold', 1, str.casefold)
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock, self._db:
+            version, = self._db.execute('PRAGMA user_version').fetchone()
+            if version == SCHEMA_VERSION:
+                return
+            logger.info(f'Recreating search index {self.path}: schema {version} -> {SCHEMA_VERSION}')
+            self._db.executescript(
+                'DROP TABLE IF EXISTS models;'
+                'DROP TABLE IF EXISTS models_fts;'
+                'CREATE TABLE models ('
+                '  id INTEGER PRIMARY KEY,'
+                '  uri TEXT NOT NULL UNIQUE,'
+                '  type TEXT NOT NULL,'
+                '  name TEXT NOT NULL,'
+                '  artist TEXT NOT NULL,'
+                '  album TEXT NOT NULL,'
+                '  data TEXT NOT NULL'
+                ');'
+                'CREATE VIRTUAL TABLE models_fts USING fts5('
+                "  name, artist, album, content='models', content_rowid='id',"
+                "  tokenize='unicode61 remove_diacritics 2'"
+                ');'
+                'CREATE TRIGGER models_ai AFTER INSERT ON models BEGIN'
+                '  INSERT INTO models_fts (rowid, name, artist, album)'
+                '    VALUES (new.id, new.name, new.artist, new.album);'
+                'END;'
+                'CREATE TRIGGER models_au AFTER UPDATE ON models BEGIN'
+                '  INSERT INTO models_fts (models_fts, rowid, name, artist, album)'
+                "    VALUES ('delete', old.id, old.name, old.artist, old.album);"
+                '  INSERT INTO models_fts (rowid, name, artist, album)'
+                '    VALUES (new.id, new.name, new.artist, new.album);'
+                'END;'
+                f'PRAGMA user_version = {SCHEMA_VERSION};'
+            )
+
+    def add(self, models):
+        """Index ``models`` along with the albums and artists of the tracks among them."""
+        found = {}
+        for model in models:
+            if isinstance(model, Track):
+                found.update((artist.uri, artist) for artist in model.artists)
+                if model.album is not None:
+                    found[model.album.uri] = model.album
+                    found.update((artist.uri, artist) for artist in model.album.artists)
+            if type(model) in TYPES:
+                found[model.uri] = model
+
+        rows = {
+            uri: (uri, TYPES[type(model)], *index_columns(model), json.dumps(model, cls=ModelJSONEncoder))
+            for uri, model in found.items()
+            if uri
+        }
+        if not rows:
+            return
+        with self._pending_lock:
+            self._pending.update(rows)
+            full = len(self._pending) >= FLUSH_SIZE
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = threading.Thread(target=self._run, name='YMusicIndex', daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write the waiting models in one transaction."""
+        with self._lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            with self._db:
+                self._db.executemany(
+                    'INSERT INTO models (uri, type, name, artist, album, data) VALUES (?, ?, ?, ?, ?, ?)'
+                    ' ON CONFLICT (uri) DO UPDATE SET name = excluded.name, artist = excluded.artist,'
+                    ' album = excluded.album, data = excluded.data WHERE data != excluded.data',
+                    list(pending.values()),
+                )
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception(f'Failed to write search index {self.path}')
+
+    def search(self, query, exact=False, limit=SEARCH_LIMIT):
+        """:class:`~mopidy.models.SearchResult` of the indexed models matching a Mopidy search ``query``."""
+        self.flush()
+        conditions, params, matches = [], [], []
+        for field, values in query.items():
+            columns = FIELD_COLUMNS.get(field)
+            if columns is None:
+                continue
+            for value in values:
+                if exact:
+                    conditions.append('(' + ' OR '.join(f'casefold(m.{column}) = ?' for column in columns) + ')')
+                    params.extend([value.casefold()] * len(columns))
+                    continue
+                tokens = ' AND '.join(f'{quote(token)}*' for token in value.split())
+                if tokens:
+                    matches.append(f'{{{" ".join(columns)}}} : ({tokens})')
+
+        if matches:
+            sql = (
+                'SELECT m.data FROM models_fts JOIN models AS m ON m.id = models_fts.rowid'
+                ' WHERE models_fts MATCH ? AND m.type = ? ORDER BY models_fts.rank LIMIT ?'
+            )
+            params = [' AND '.join(matches)]
+        elif conditions:
+            sql = f'SELECT m.data FROM models AS m WHERE {" AND ".join(conditions)} AND m.type = ? LIMIT ?'
+        else:
+            return SearchResult(uri='ymusic:search')
+
+        results = {}
+        with self._lock:
+            for kind in TYPES.values():
+                rows = self._db.execute(sql, [*params, kind, limit]).fetchall()
+                results[kind] = [json.loads(data, object_hook=model_json_decoder) for data, in rows]
+        return SearchResult(
+            uri='ymusic:search',
+            tracks=results['track'],
+            albums=results['album'],
+            artists=results['artist'],
+        )
+
+    def __len__(self):
+        self.flush()
+        with self._lock:
+            count, = self._db.execute('SELECT COUNT(*) FROM models').fetchone()
+        return count
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._lock:
+            self._db.close()
@@ -1,10 +1,17 @@
-import functools
+import collections
+import concurrent.futures
+import itertools
 import logging
+import threading
+import time
 
 from mopidy.backend import LibraryProvider
 from mopidy.models import Image, Ref, SearchResult
 
-from .models import RefType, to_model, to_ref
+from .cache import DEFAULT_TTL, TTLCache
+from .index import FIELD_COLUMNS, index_columns
+from .models import RefType, to_model, to_ref, to_uri
+from .web import image_filename, local_image_uri
 
 
 logger = logging.getLogger(__name__)
@@ -12,6 +19,71 @@ logger = logging.getLogger(__name__)
 
 ROOT_DIR = Ref.directory(uri=f'ymusic:{RefType.DIRECTORY.value}:root', name='Yandex Music')
 ROOT_ARTWORK_URI = 'yastatic.net/doccenter/images/support.yandex.com/en/music/freeze/fzG5B6KxX0dggCpZn4SQBpnF4GA.png'
+LOOKUP_CHUNK_SIZE = 100
+SEARCH_TYPES = {
+    'any': 'all',
+    'artist': 'artist',
+    'albumartist': 'artist',
+    'album': 'album',
+    'track': 'track',
+    'track_name': 'track',
+}
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def cache_kind(uri):
+    """Entity kind used to pick the cache time to live for ``uri``."""
+    if uri == ROOT_DIR.uri:
+        return 'feed'
+    _, ref_type, item_id = uri.split(':', 2)
+    if ref_type == RefType.DIRECTORY.value or item_id.startswith('event:'):
+        return 'event'
+    return ref_type
+
+
+def parse_page(item_id):
+    """Split ``<id>[:<page>]`` of a paged browse URI."""
+    item_id, _, page = item_id.partition(':')
+    return item_id, int(page or 0)
+
+
+def matched_fields(model, texts):
+    """Number of query fields whose every word appears in the matching fields of ``model``."""
+    columns = dict(zip(('name', 'artist', 'album'), (column.casefold() for column in index_columns(model))))
+    return sum(
+        all(any(word in columns[column] for column in FIELD_COLUMNS[field]) for word in text.casefold().split())
+        for field, text in texts.items()
+    )
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+class PendingSearch:
+    """Remote search waiting for its results, woken up when they arrive or when it is superseded."""
+
+    def __init__(self, text):
+        self.text = text
+        self.superseded = False
+        self.wake = threading.Event()
+
+
+def merge_models(*groups):
+    """Concatenate model lists, keeping the first model for every URI."""
+    models = {}
+    for group in groups:
+        for model in group:
+            models.setdefault(model.uri, model)
+    return list(models.values())
+
+
+def more_ref(ref_type, item_id, page):
+    return Ref.directory(uri=f'ymusic:{ref_type.value}:{item_id}:{page}', name='More…')
 
 
 class YMusicLibraryProvider(LibraryProvider):
@@ -25,45 +97,132 @@ class YMusicLibraryProvider(LibraryProvider):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._feed = None
+        self._feed_events = {}
+        self._feed_loaded_at = 0
+        self._feed_lock = threading.Lock()
+        self._feed_refreshing = False
+        config = self.backend.config['ymusic']
+        self.search_cache = TTLCache(ttl=config['search_cache_ttl'], maxsize=config['search_cache_size'])
+        self._searches = set()
+        self._searches_lock = threading.Lock()
 
     @property
     def feed(self):
-        if self._feed is not None:
-            return self._feed
-        self._feed = self.backend.client.feed()
+        """The feed, fetched on first use and refreshed in the background once expired."""
+        self._ensure_feed()
         return self._feed
 
+    def _ensure_feed(self):
+        if self._feed is None:
+            self._load_feed()
+        elif time.monotonic() - self._feed_loaded_at >= self.backend.cache.ttls.get('feed', DEFAULT_TTL):
+            self._refresh_feed_in_background()
+
+    @property
+    def feed_events(self):
+        feed = self.feed
+        return feed.days[0].events if feed.days else []
+
     def get_feed_event(self, event_id):
-        for event in self.feed.days[0].events:
-            if event.id == event_id:
-                return event
+        self._ensure_feed()
+        return self._feed_events.get(event_id)
+
+    def _load_feed(self):
+        """Load the feed, dropping the cached listings built from the one it replaces."""
+        feed = self.backend.client.feed()
+        events = {event.id: event for event in feed.days[0].events} if feed.days else {}
+        with self._feed_lock:
+            replaced = self._feed is not None
+            self._feed, self._feed_events = feed, events
+            self._feed_loaded_at = time.monotonic()
+        if replaced:
+            self.backend.cache.invalidate(uri=ROOT_DIR.uri)
+            self.backend.cache.invalidate(kind='event')
+
+    def _refresh_feed_in_background(self):
+        with self._feed_lock:
+            if self._feed_refreshing:
+                return
+            self._feed_refreshing = True
+
+        def refresh():
+            try:
+                self._load_feed()
+            except Exception:
+                logger.exception('Failed to refresh feed')
+            finally:
+                self._feed_refreshing = False
+
+        threading.Thread(target=refresh, name='YMusicFeedRefresh', daemon=True).start()
+
+    def refresh(self, uri=None):
+        logger.info(f'library.refresh: {uri}')
+        if uri is None or uri == ROOT_DIR.uri:
+            self._feed = None
+            uri = None
+        self.backend.cache.invalidate(uri=uri)
+        if uri is None or uri.startswith(self.backend.sync.root_directory.uri):
+            self.backend.sync.sync()
+
+    def warm_up(self):
+        """Reload the feed and cache the root and feed event listings, returning the URIs of their refs."""
+        self._load_feed()
+        listings = {ROOT_DIR.uri: self._browse(ROOT_DIR.uri)}
+        for ref in listings[ROOT_DIR.uri]:
+            if ref.type == Ref.DIRECTORY and ref.uri != self.backend.sync.root_directory.uri:
+                listings[ref.uri] = self._browse(ref.uri) or []
+        for uri, refs in listings.items():
+            self.backend.cache.set(cache_kind(uri), uri, refs, op='browse')
+        return [ref.uri for refs in listings.values() for ref in refs]
 
-    @functools.lru_cache(maxsize=256)
     def browse(self, uri):
         logger.info(f'browse: {uri}')
+        refs = self.backend.sync.browse(uri)
+        if refs is not None:
+            return refs
+        return self.backend.cache.get_or_load(cache_kind(uri), uri, lambda: self._browse(uri), op='browse') or []
+
+    def _browse(self, uri):
         refs = []
         if uri == ROOT_DIR.uri:
             refs.extend(
                 Ref.directory(uri=f'ymusic:{RefType.DIRECTORY.value}:{event.id}', name=event.title)
                 if not event.tracks else Ref.playlist(uri=f'ymusic:playlist:event:{event.id}', name=event.title)
-                for event in self.feed.days[0].events
+                for event in self.feed_events
                 if event.id not in self.ignore_events
             )
+            refs.extend(self.backend.radio.as_list())
+            if self.backend.sync.enabled:
+                refs.append(self.backend.sync.root_directory)
             return refs
 
         _, ref_type, item_id = uri.split(':', 2)
         if ref_type == RefType.DIRECTORY.value:
             event = self.get_feed_event(item_id)
+            if event is None:
+                logger.info(f'Feed event {item_id} is gone')
+                return None
             refs.extend([
                 *[to_ref(artist_event.artist) for artist_event in event.artists],
                 *[to_ref(album_event.album) for album_event in event.albums],
             ])
 
         if ref_type == RefType.ALBUM.value:
-            refs.extend(to_ref(track) for track in self._get_album_tracks(item_id))
+            album_id, page = parse_page(item_id)
+            size = self.backend.config['ymusic']['browse_page_size']
+            tracks = itertools.islice(self._get_album_tracks(album_id), page * size, (page + 1) * size + 1)
+            refs.extend(to_ref(track) for track in tracks)
+            if len(refs) > size:
+                refs[size:] = [more_ref(RefType.ALBUM, album_id, page + 1)]
 
         if ref_type == RefType.ARTIST.value:
-            refs.extend(to_ref(track) for track in self._get_artist_tracks(item_id))
+            artist_id, page = parse_page(item_id)
+            size = self.backend.config['ymusic']['browse_page_size']
+            result = self.backend.client.artists_tracks(artist_id, page=page, page_size=size)
+            if result is not None:
+                refs.extend(to_ref(track) for track in result.tracks)
+                if result.pager and (page + 1) * result.pager.per_page < result.pager.total:
+                    refs.append(more_ref(RefType.ARTIST, artist_id, page + 1))
 
         return refs
 
@@ -73,105 +232,320 @@ class YMusicLibraryProvider(LibraryProvider):
             yield from volume
 
     def _get_artist_tracks(self, artist_id):
-        return self.backend.client.artists_tracks(artist_id)
-
-    def _get_tracks(self, track_id):
-        return self.backend.client.tracks(track_id)
+        """Yield the artist tracks page by page, up to ``artist_tracks_limit`` of them."""
+        config = self.backend.config['ymusic']
+        return itertools.islice(
+            self._iter_artist_tracks(artist_id, config['browse_page_size']),
+            config['artist_tracks_limit'],
+        )
+
+    def _iter_artist_tracks(self, artist_id, page_size):
+        for page in itertools.count():
+            result = self.backend.client.artists_tracks(artist_id, page=page, page_size=page_size)
+            if result is None or not result.tracks:
+                return
+            yield from result.tracks
+            if not result.pager or (page + 1) * result.pager.per_page >= result.pager.total:
+                return
+
+    def _get_tracks(self, track_ids):
+        return self.backend.client.tracks(track_ids)
 
-    @functools.lru_cache(maxsize=256)
     def lookup(self, uri):
         logger.info(f'library.lookup: {uri}')
-        items = []
+        return self.backend.cache.get_or_load(cache_kind(uri), uri, lambda: self._lookup(uri), op='lookup')
+
+    def _lookup(self, uri):
+        tracks = []
         _, ref_type, item_id = uri.split(':', 2)
 
         if ref_type == RefType.TRACK.value:
-            items.extend(to_model(track) for track in self._get_tracks(item_id))
+            tracks = self._get_tracks(item_id)
 
         elif ref_type == RefType.ALBUM.value:
-            items.extend(to_model(track) for track in self._get_album_tracks(item_id))
+            tracks = self._get_album_tracks(item_id)
 
         elif ref_type == RefType.ARTIST.value:
-            items.extend(to_model(track) for track in self._get_artist_tracks(item_id))
+            tracks = self._get_artist_tracks(item_id)
+
+        items = self._to_models(tracks, 'lookup')
+        self.backend.index.add(items)
         return items
 
+    def _to_models(self, items, op):
+        """Convert the fetched ``items``, timing the conversion as ``op`` in the backend metrics."""
+        items = list(items)
+        with self.backend.metrics.timer('convert', op):
+            return [to_model(item) for item in items]
+
+    def lookup_many(self, uris):
+        """Lookup several URIs at once.
+
+        Track URIs are fetched with a single ``client.tracks`` call per chunk of
+        ``LOOKUP_CHUNK_SIZE`` ids. Albums and artists have no multi-id endpoint
+        returning their tracks, so repeated URIs are fetched only once. A failed
+        chunk, album or artist gives an empty, uncached result for its URIs only.
+        """
+        logger.info(f'library.lookup_many: {len(uris)} uris')
+        cache = self.backend.cache
+        results = {}
+        failed = set()
+        grouped = collections.defaultdict(dict)
+        for uri in uris:
+            results[uri] = cache.get(cache_kind(uri), uri, op='lookup')
+            if results[uri] is None:
+                _, ref_type, item_id = uri.split(':', 2)
+                grouped[ref_type][item_id] = uri
+                results[uri] = []
+
+        tracks = grouped[RefType.TRACK.value]
+        for chunk in chunked(list(tracks), LOOKUP_CHUNK_SIZE):
+            try:
+                models = self._to_models(self._get_tracks(chunk), 'lookup')
+            except Exception:
+                logger.exception(f'Failed to look up {len(chunk)} tracks')
+                failed.update(tracks[track_id] for track_id in chunk)
+                continue
+            for model in models:
+                if model.uri in results:
+                    results[model.uri].append(model)
+
+        for ref_type, get_tracks in (
+            (RefType.ALBUM.value, self._get_album_tracks),
+            (RefType.ARTIST.value, self._get_artist_tracks),
+        ):
+            for item_id, uri in grouped[ref_type].items():
+                try:
+                    results[uri] = self._to_models(get_tracks(item_id), 'lookup')
+                except Exception:
+                    logger.exception(f'Failed to look up {uri}')
+                    failed.add(uri)
+
+        looked_up = [uri for uris_by_id in grouped.values() for uri in uris_by_id.values() if uri not in failed]
+        for uri in looked_up:
+            cache.set(cache_kind(uri), uri, results[uri], op='lookup')
+        self.backend.index.add(model for uri in looked_up for model in results[uri])
+        return results
+
     def search(self, query, uris, exact=False):
+        """Search the local index, starting a remote search in the background unless ``exact`` is set.
+
+        The remote search is skipped when ``search_remote`` is disabled, its
+        results are indexed for later searches. With ``search_remote_wait`` it
+        is waited for and merged in, the local results are returned alone when
+        it fails. Searches limited to ``uris`` of other backends return
+        :obj:`None` right away.
+        """
         logger.info(f'search: {query}')
-        search_type = 'all'
-        text = ''
-        if 'any' in query:
-            text = ' '.join(query['any'])
-            search_type = 'all'
-        if 'artist' in query:
-            text = ' '.join(query['artist'])
-            search_type = 'artist'
-        if 'album' in query:
-            text = ' '.join(query['album'])
-            search_type = 'album'
-        if 'track' in query:
-            text = ' '.join(query['track'])
-            search_type = 'track'
-
-        if not text:
-            return SearchResult(uri='ymusic:search')
-
-        albums = []
-        search_result = self.backend.client.search(text, type_=search_type)
-        if search_result.albums:
-            albums = [to_model(album) for album in search_result.albums.results]
-        artists = []
-        if search_result.artists:
-            artists = [to_model(artist) for artist in search_result.artists.results]
-        tracks = []
-        if search_result.tracks:
-            tracks = [to_model(track) for track in search_result.tracks.results]
-        return SearchResult(uri='ymusic:search', albums=albums, artists=artists, tracks=tracks)
+        if uris and not any(uri.startswith('ymusic:') for uri in uris):
+            return None
+
+        local = self.backend.index.search(query, exact=exact)
+        config = self.backend.config['ymusic']
+        if exact or not config['search_remote']:
+            return local
+        if not config['search_remote_wait']:
+            threading.Thread(target=self._index_remote, args=(query,), name='YMusicSearch', daemon=True).start()
+            return local
+
+        remote = self._index_remote(query)
+        if remote is None:
+            return local
+        return SearchResult(
+            uri='ymusic:search',
+            tracks=merge_models(local.tracks, remote.tracks),
+            albums=merge_models(local.albums, remote.albums),
+            artists=merge_models(local.artists, remote.artists),
+        )
+
+    def _index_remote(self, query):
+        """Results of the remote search, added to the index, :obj:`None` when it failed or was superseded."""
+        try:
+            remote = self._search_remote(query)
+        except Exception:
+            logger.exception(f'Remote search failed for {query}')
+            return None
+        if remote is not None:
+            self.backend.index.add([*remote.tracks, *remote.albums, *remote.artists])
+        return remote
+
+    def _search_remote(self, query):
+        """Run one typed Yandex search per query field, ``search_pages`` pages each, concurrently.
+
+        Results found by all searches are merged, those matching more query
+        fields and returned by more searches come first. A search superseded
+        by a longer one, as typeahead clients send them, stops waiting and
+        returns :obj:`None`.
+        """
+        texts = {field: ' '.join(' '.join(query[field]).split()) for field in SEARCH_TYPES if query.get(field)}
+        if not any(texts.values()):
+            return None
+
+        futures = [
+            self.backend.executor.submit(self._search_page, text, SEARCH_TYPES[field], page)
+            for field, text in texts.items()
+            for page in range(self.backend.config['ymusic']['search_pages'])
+        ]
+        if not self._wait_for_search(normalize(' '.join(texts.values())), futures):
+            logger.info(f'Search for {query} superseded')
+            return None
+
+        found = {'tracks': {}, 'albums': {}, 'artists': {}}
+        for future in futures:
+            for attr, models in found.items():
+                for model in future.result()[attr]:
+                    hits = models.setdefault(model.uri, [model, 0])
+                    hits[1] += 1
+
+        def rank(models):
+            ranked = sorted(
+                enumerate(models.values()),
+                key=lambda entry: (-matched_fields(entry[1][0], texts), -entry[1][1], entry[0]),
+            )
+            return [model for _, (model, _) in ranked]
+
+        return SearchResult(uri='ymusic:search', **{attr: rank(models) for attr, models in found.items()})
+
+    def _wait_for_search(self, text, futures):
+        """Wait for ``futures``, return :obj:`False` if a search extending ``text`` started meanwhile."""
+        pending = PendingSearch(text)
+        with self._searches_lock:
+            for other in self._searches:
+                if other.text != text and text.startswith(other.text):
+                    other.superseded = True
+                    other.wake.set()
+            self._searches.add(pending)
+
+        for future in futures:
+            future.add_done_callback(lambda _: pending.wake.set())
+        try:
+            while not all(future.done() for future in futures):
+                pending.wake.wait()
+                pending.wake.clear()
+                if pending.superseded:
+                    self.backend.metrics.increment('searches_superseded')
+                    return False
+        finally:
+            with self._searches_lock:
+                self._searches.discard(pending)
+        return True
+
+    def _search_page(self, text, type_, page):
+        """Converted models of a single search results page, cached for ``search_cache_ttl`` seconds."""
+        key = (normalize(text), type_, page)
+        models = self.search_cache.get(key)
+        if models is not None:
+            return models
+
+        result = self.backend.client.search(text, type_=type_, page=page)
+        models = {}
+        for attr in ('tracks', 'albums', 'artists'):
+            results = getattr(result, attr) if result is not None else None
+            models[attr] = self._to_models(results.results, 'search') if results else []
+        self.search_cache.set(key, models)
+        return models
+
+    def _get_event_artwork(self, event_id):
+        event = self.get_feed_event(event_id)
+        if event is None:
+            return ''
+        if event.type == 'artists':
+            return event.artists[0].artist.cover.uri
+        if event.type == 'tracks':
+            return event.tracks[0].cover_uri
+        if event.type == 'albums':
+            return event.albums[0].album.cover_uri
+        return ''
 
     def get_images(self, uris):
+        """Resolve artwork for ``uris``.
+
+        Tracks, albums, artists and user playlists are fetched with one
+        multi-id call per type, charts with one call each. The calls run
+        concurrently on the backend executor and the images are cached by URI.
+        """
         logger.info(f'images: {uris}')
+        cache = self.backend.cache
         images = {}
+        artworks = {}
+        grouped = collections.defaultdict(dict)
         for uri in uris:
-            artwork = ''
+            cached = cache.get(cache_kind(uri), uri, op='images')
+            if cached is not None:
+                if cached:
+                    images[uri] = cached
+                continue
+
             _, ref_type, item_id = uri.split(':', 2)
+            if uri in (self.backend.radio.ref.uri, self.backend.sync.likes.ref.uri):
+                continue
             if ref_type == RefType.DIRECTORY.value:
-                if item_id == 'root':
-                    artwork = ROOT_ARTWORK_URI
-                else:
-                    event = self.get_feed_event(item_id)
-                    if event.type == 'artists':
-                        artwork = event.artists[0].artist.cover.uri
-                    elif event.type == 'tracks':
-                        artwork = event.tracks[0].cover_uri
-                    elif event.type == 'albums':
-                        artwork = event.albums[0].album.cover_uri
-
-            elif ref_type == RefType.TRACK.value:
-                track = self.backend.client.tracks(item_id)[0]
-                artwork = track.cover_uri
-
-            elif ref_type == RefType.ALBUM.value:
-                album = self.backend.client.albums(item_id)[0]
-                artwork = album.cover_uri
-
-            elif ref_type == RefType.ARTIST.value:
-                artist = self.backend.client.artists(item_id)[0]
-                artwork = artist.cover.uri
-
-            elif ref_type == RefType.PLAYLIST.value:
-                playlist = None
-                if item_id.startswith('event'):
-                    _, event_id = item_id.split(':', 1)
-                    event = self.get_feed_event(event_id)
-                    if event.tracks:
-                        artwork = event.tracks[0].cover_uri
-                elif item_id in self.backend.playlists.chart_types:
-                    playlist = self.backend.client.chart(item_id).chart
-                else:
-                    playlist = self.backend.client.playlists_list([item_id])[0]
-                if playlist:
-                    artwork = playlist.cover.uri
-
-            if artwork:
-                artwork_uri = f'https://{artwork.replace("%%", "400x400")}'
-                images[uri] = [Image(uri=artwork_uri)]
+                artworks[uri] = ROOT_ARTWORK_URI if item_id == 'root' else self._get_event_artwork(item_id)
+            elif ref_type == RefType.PLAYLIST.value and item_id.startswith('event'):
+                _, event_id = item_id.split(':', 1)
+                event = self.get_feed_event(event_id)
+                artworks[uri] = event.tracks[0].cover_uri if event is not None and event.tracks else ''
+            elif ref_type == RefType.PLAYLIST.value and item_id in self.backend.playlists.chart_types:
+                grouped['chart'][item_id] = uri
+            else:
+                grouped[ref_type][item_id] = uri
+
+        client = self.backend.client
+        fetchers = {
+            RefType.TRACK.value: lambda ids: [(to_uri(track), track.cover_uri) for track in client.tracks(ids)],
+            RefType.ALBUM.value: lambda ids: [(to_uri(album), album.cover_uri) for album in client.albums(ids)],
+            RefType.ARTIST.value: lambda ids: [
+                (to_uri(artist), artist.cover.uri if artist.cover else '') for artist in client.artists(ids)
+            ],
+            RefType.PLAYLIST.value: lambda ids: [
+                (to_uri(playlist), playlist.cover.uri if playlist.cover else '')
+                for playlist in client.playlists_list(ids)
+            ],
+        }
+        futures = {
+            self.backend.executor.submit(fetchers[ref_type], list(uris_by_id)): uris_by_id
+            for ref_type, uris_by_id in grouped.items()
+            if ref_type in fetchers
+        }
+        futures.update({
+            self.backend.executor.submit(self._get_chart_artwork, chart_id): {chart_id: uri}
+            for chart_id, uri in grouped['chart'].items()
+        })
+
+        for future in concurrent.futures.as_completed(futures):
+            requested = set(futures[future].values())
+            try:
+                artworks.update((uri, artwork) for uri, artwork in future.result() if uri in requested)
+            except Exception:
+                logger.exception(f'Failed to get images for {sorted(requested)}')
+
+        for uri, artwork in artworks.items():
+            result = self._get_artwork_images(artwork) if artwork else []
+            cache.set(cache_kind(uri), uri, result, op='images')
+            if result:
+                images[uri] = result
 
         return images
+
+    def _get_artwork_images(self, artwork):
+        """Images of ``artwork`` at ``image_size``, or local copies at ``image_cache_sizes`` with the image cache."""
+        config = self.backend.config['ymusic']
+        image_cache = self.backend.image_cache
+        if image_cache is None:
+            return [Image(uri=f'https://{artwork.replace("%%", config["image_size"])}')]
+
+        images = []
+        for size in config['image_cache_sizes']:
+            url = f'https://{artwork.replace("%%", size)}'
+            name = image_filename(url)
+            if image_cache.get(name) is None:
+                image_cache.download(name, url)
+            width, _, height = size.partition('x')
+            dimensions = {'width': int(width), 'height': int(height)} if f'{width}{height}'.isdigit() else {}
+            images.append(Image(uri=local_image_uri(url), **dimensions))
+        return images
+
+    def _get_chart_artwork(self, chart_id):
+        playlist = self.backend.client.chart(chart_id).chart
+        uri = f'ymusic:{RefType.PLAYLIST.value}:{chart_id}'
+        return [(uri, playlist.cover.uri if playlist.cover else '')]
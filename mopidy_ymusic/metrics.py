@@ -0,0 +1,189 @@
+import bisect
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+import pykka
+
+
+logger = logging.getLogger(__name__)
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+#: Histogram kind -> (Prometheus metric name, label name, help text)
+HISTOGRAMS = {
+    'api': ('ymusic_api_request_duration_seconds', 'method', 'Yandex Music API call latency.'),
+    'call': ('ymusic_call_duration_seconds', 'call', 'Backend provider call duration.'),
+    'queue': ('ymusic_queue_wait_seconds', 'call', 'Time backend calls waited for the actor or a worker thread.'),
+    'convert': ('ymusic_convert_duration_seconds', 'op', 'Time spent converting API objects to Mopidy models.'),
+}
+
+#: Counter name -> (Prometheus metric name, help text)
+COUNTERS = {
+    'searches_superseded': (
+        'ymusic_searches_superseded_total',
+        'Remote searches answered locally because a longer search replaced them.',
+    ),
+}
+
+_published = None
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+@pykka.traversable
+class Metrics:
+    """Latency histograms, API error counts, event counters and cache hit counters of the backend.
+
+    :meth:`render` formats them for Prometheus, :meth:`summary` as a single
+    log line. Caches are registered with a callable returning their
+    ``{kind: {'hits': ..., 'misses': ...}}`` counters, read only when
+    rendering.
+    """
+
+    def __init__(self):
+        self.histograms = {kind: collections.defaultdict(Histogram) for kind in HISTOGRAMS}
+        self.errors = collections.Counter()
+        self.counters = collections.Counter()
+        self.caches = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def observe(self, kind, label, value):
+        with self._lock:
+            self.histograms[kind][label].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, kind, label):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(kind, label, time.perf_counter() - started)
+
+    def increment(self, name):
+        """Count an occurrence of the ``COUNTERS`` event ``name``."""
+        with self._lock:
+            self.counters[name] += 1
+
+    def call_api(self, method, fn, *args, **kwargs):
+        """Call ``fn`` recording its latency and errors as those of the API ``method``."""
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.errors[method] += 1
+            raise
+        finally:
+            self.observe('api', method, time.perf_counter() - started)
+
+    def register_cache(self, name, stats):
+        self.caches[name] = stats
+
+    def cache_stats(self):
+        return {name: stats() for name, stats in self.caches.items()}
+
+    def render(self):
+        """Prometheus text exposition of all metrics."""
+        lines = []
+        with self._lock:
+            for kind, (name, label_name, help_text) in HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for label, histogram in sorted(self.histograms[kind].items()):
+                    label = f'{label_name}="{escape(label)}"'
+                    cumulative = 0
+                    for bound, count in zip((*BUCKETS, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+            name = 'ymusic_api_errors_total'
+            lines += [f'# HELP {name} Failed Yandex Music API calls.', f'# TYPE {name} counter']
+            for method, count in sorted(self.errors.items()):
+                lines.append(f'{name}{{method="{escape(method)}"}} {count}')
+
+            for counter, (name, help_text) in COUNTERS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter', f'{name} {self.counters[counter]}']
+
+        name = 'ymusic_cache_requests_total'
+        lines += [f'# HELP {name} Cache lookups by result.', f'# TYPE {name} counter']
+        for cache, kinds in sorted(self.cache_stats().items()):
+            for kind, stats in sorted(kinds.items()):
+                for key, result in (('hits', 'hit'), ('misses', 'miss')):
+                    labels = f'cache="{cache}",kind="{escape(kind)}",result="{result}"'
+                    lines.append(f'{name}{{{labels}}} {stats[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One line with API call counts and latency, error counts, cache hit ratios and queue waits."""
+        with self._lock:
+            api = self.histograms['api'].items()
+            calls = sum(histogram.count for _, histogram in api)
+            slowest = sorted(api, key=lambda item: item[1].sum, reverse=True)[:3]
+            slowest = ', '.join(f'{method} {mean_ms(histogram)} ms x{histogram.count}' for method, histogram in slowest)
+            errors = sum(self.errors.values())
+            queue = list(self.histograms['queue'].values())
+            queue_count = sum(histogram.count for histogram in queue)
+            queue_mean = round(sum(histogram.sum for histogram in queue) / queue_count * 1000, 1) if queue_count else 0
+
+        ratios = []
+        for cache, kinds in sorted(self.cache_stats().items()):
+            hits = sum(stats['hits'] for stats in kinds.values())
+            total = hits + sum(stats['misses'] for stats in kinds.values())
+            ratios.append(f'{cache} {round(hits / total * 100) if total else 0}%')
+        return (
+            f'API: {calls} calls, {errors} errors, slowest: {slowest or "none"}; '
+            f'cache hits: {", ".join(ratios)}; queue wait: {queue_mean} ms mean over {queue_count} calls'
+        )
+
+    def start(self, interval):
+        """Log :meth:`summary` every ``interval`` seconds, never if it is 0."""
+        if not interval or self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='YMusicMetrics', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread = None
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            logger.info(f'Metrics: {self.summary()}')
+
+
+def publish(metrics):
+    """Make ``metrics`` those of the running backend, or none with :obj:`None`."""
+    global _published
+    _published = metrics
+
+
+def published():
+    """The metrics of the running backend, read directly by the web handler without going through the actor."""
+    return _published
+
+
+def mean_ms(histogram):
+    return round(histogram.sum / histogram.count * 1000, 1) if histogram.count else 0
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
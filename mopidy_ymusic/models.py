@@ -1,5 +1,6 @@
 import enum
 import functools
+import weakref
 
 import yandex_music
 from mopidy.models import Album, Artist, Playlist, Ref, Track
@@ -30,24 +31,41 @@ def _(obj: yandex_music.Track):
 
 @to_uri.register
 def _(obj: yandex_music.Playlist):
+    if obj.owner is not None and obj.kind is not None:
+        return f'ymusic:{RefType.PLAYLIST.value}:{obj.playlist_id}'
     return f'ymusic:{RefType.PLAYLIST.value}:{obj.uid}'
 
 
+_interned = weakref.WeakValueDictionary()
+
+
+def intern(key, factory):
+    """Return the model built for ``key`` while it is alive, build it with ``factory`` otherwise.
+
+    Mopidy already deduplicates equal models, but only after they are built
+    and validated. Keying on the source fields skips that work for artists
+    and albums repeated across many tracks.
+    """
+    model = _interned.get(key)
+    if model is None:
+        model = _interned.setdefault(key, factory())
+    return model
+
+
 @functools.singledispatch
 def to_model(obj: yandex_music.Album):
-    return Album(
-        uri=to_uri(obj),
-        name=obj.title,
-        artists=[to_model(artist) for artist in obj.artists],
+    artists = [to_model(artist) for artist in obj.artists]
+    return intern(
+        (to_uri(obj), obj.title, *(artist.uri for artist in artists)),
+        lambda: Album(uri=to_uri(obj), name=obj.title, artists=artists),
     )
 
 
 @to_model.register
 def _(obj: yandex_music.Artist):
-    return Artist(
-        uri=to_uri(obj),
-        name=obj.name,
-        sortname=obj.name,
+    return intern(
+        (to_uri(obj), obj.name),
+        lambda: Artist(uri=to_uri(obj), name=obj.name, sortname=obj.name),
     )
 
 
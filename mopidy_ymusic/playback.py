@@ -1,23 +1,209 @@
 import logging
+import queue
+import threading
+from urllib.parse import urlsplit
 
+import pykka
 from mopidy.backend import PlaybackProvider
 
+from .cache import TTLCache
+
 
 logger = logging.getLogger(__name__)
 
 
+CORE_TIMEOUT = 5
+
+
+class LinkPrefetcher:
+    """Resolves direct links for the tracks following the one being played.
+
+    Runs on its own daemon thread so that neither the backend actor nor the
+    core actor waits on the download-info requests.
+    """
+
+    def __init__(self, playback, count):
+        self.playback = playback
+        self.count = count
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self.count <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='YMusicLinkPrefetcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def schedule(self, uri):
+        if self._thread is not None:
+            self._queue.put(uri)
+
+    def _run(self):
+        while True:
+            uri = self._queue.get()
+            if uri is None:
+                return
+            try:
+                for next_uri in self._get_next_uris(uri):
+                    self.playback.resolve(next_uri)
+            except Exception:
+                logger.exception(f'Failed to prefetch links after {uri}')
+
+    def _get_next_uris(self, uri):
+        cores = pykka.ActorRegistry.get_by_class_name('Core')
+        if not cores:
+            return []
+        tracklist = cores[0].proxy().tracklist
+
+        tl_track = next(
+            (tl_track for tl_track in tracklist.get_tl_tracks().get(CORE_TIMEOUT) if tl_track.track.uri == uri),
+            None,
+        )
+        uris = []
+        for _ in range(self.count):
+            tl_track = tracklist.next_track(tl_track).get(CORE_TIMEOUT)
+            if tl_track is None or tl_track.track.uri == uri:
+                break
+            if tl_track.track.uri.startswith('ymusic:track:'):
+                uris.append(tl_track.track.uri)
+        return uris
+
+
 class YMusicPlaybackProvider(PlaybackProvider):
 
+    def __init__(self, audio, backend):
+        super().__init__(audio, backend)
+        config = backend.config['ymusic']
+        self.links = TTLCache(ttl=config['link_ttl'])
+        self.variants = {}
+        self.prefetcher = LinkPrefetcher(self, count=config['prefetch_count'])
+        self._change_position = None
+
+    def prepare_change(self):
+        self._change_position = self.get_time_position()
+        super().prepare_change()
+
+    def change_track(self, track):
+        """Tell the radio about the track change, passing the position the previous track was left at.
+
+        Gapless changes to the next track are not preceded by
+        :meth:`prepare_change`, the previous track played to its end then.
+        """
+        position, self._change_position = self._change_position, None
+        try:
+            self.backend.radio.track_changed(track, position)
+        except Exception:
+            logger.exception(f'Failed to pass the change to {track.uri} on to the radio')
+        return super().change_track(track)
+
     def translate_uri(self, uri):
+        """Direct link of the track, or a ``file://`` URI when the audio cache holds it.
+
+        Tracks missing from the audio cache play from the direct link while
+        they are downloaded to it in the background. Cached files are named
+        after the download variant selected for the track, which is resolved
+        first when not known yet.
+        """
         logger.info(f'Translate URI: {uri}')
+        self.prefetcher.schedule(uri)
+        audio_cache = self.backend.audio_cache
+        if audio_cache is None:
+            return self.resolve(uri)
+
+        link = None
+        if self.variant(uri) is None:
+            link = self.resolve(uri)
+        variant = self.variant(uri)
+        if variant is None:
+            return link
+
+        path = audio_cache.get(audio_filename(variant))
+        if path is not None:
+            return path.as_uri()
+        link = link or self.resolve(uri)
+        if link is not None:
+            audio_cache.download(audio_filename(self.variant(uri)), link)
+        return link
 
+    def variant(self, uri):
+        """``(track_id, codec, bitrate)`` of the download variant last selected for the track, if known."""
+        key = self.link_key(uri)
+        if key is None:
+            return None
+        selected = self.variants.get(key)
+        return None if selected is None else (key[0], *selected)
+
+    def link_key(self, uri):
         _, ref_type, params = uri.split(':', 2)
         if ref_type != 'track':
-            return
+            return None
 
+        config = self.backend.config['ymusic']
         track_id, *_ = params.split(':', 1)
-        infos = self.backend.client.tracks_download_info(track_id, get_direct_links=True)
-        for info in infos:
-            logger.info(f'Got info: {info}')
-            if info.codec == 'mp3' and info.bitrate_in_kbps == self.backend.config['ymusic']['bitrate']:
-                return info.direct_link
+        return track_id, config['codecs'][0], config['bitrate']
+
+    def resolve(self, uri, refresh=False):
+        """Direct link of the track, resolved again when ``refresh`` is set even if one is cached."""
+        key = self.link_key(uri)
+        if key is None:
+            return
+
+        config = self.backend.config['ymusic']
+        track_id, *_ = key
+        link = None if refresh else self.links.get(key)
+        if link is not None:
+            return link
+
+        infos = self.backend.client.tracks_download_info(track_id)
+        info = select_download_info(infos, config['codecs'], config['bitrate'])
+        if info is None:
+            logger.warning(f'No download variant of {uri} matches codecs {config["codecs"]}')
+            return
+
+        logger.info(f'Selected {info.codec}/{info.bitrate_in_kbps} for {uri}')
+        self.variants[key] = info.codec, info.bitrate_in_kbps
+        link = self.backend.metrics.call_api('get_direct_link', info.get_direct_link)
+        link = api_scheme_link(link, config['base_url'])
+        self.links.set(key, link)
+        return link
+
+
+def api_scheme_link(link, base_url):
+    """``link`` fetched over plain HTTP when ``base_url`` is an HTTP API on the same host.
+
+    Direct links are always built as ``https`` URLs, a stand-in API
+    configured with ``base_url`` serves them over the scheme it uses itself.
+    """
+    if not base_url or not base_url.startswith('http://'):
+        return link
+    host = urlsplit(base_url).netloc
+    if urlsplit(link).netloc != host:
+        return link
+    return 'http' + link[len('https'):]
+
+
+def audio_filename(key):
+    track_id, codec, bitrate = key
+    return f'{track_id}-{bitrate}.{codec}'
+
+
+def select_download_info(infos, codecs, bitrate):
+    """Pick the download variant matching the preferences best.
+
+    Codecs are tried in order of preference. Within a codec the exact bitrate
+    wins, then the closest lower one, then the closest higher one.
+    """
+    for codec in codecs:
+        candidates = [info for info in infos if info.codec == codec and not info.preview]
+        if candidates:
+            return min(candidates, key=lambda info: (
+                info.bitrate_in_kbps > bitrate,
+                abs(info.bitrate_in_kbps - bitrate),
+            ))
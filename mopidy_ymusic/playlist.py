@@ -1,55 +1,132 @@
 import logging
-from functools import lru_cache
 
 from mopidy.backend import PlaylistsProvider
 from mopidy.models import Playlist, Ref
 
-from .models import to_model
+from .models import to_model, to_ref
 
 
 logger = logging.getLogger(__name__)
 
 
-WORLD_TOP_100 = Ref.playlist(uri='ymusic:playlist:world', name='World Top 100')
+CHART_NAMES = {
+    'world': 'World Top 100',
+    'russia': 'Russia Top 100',
+}
+WORLD_TOP_100 = Ref.playlist(uri='ymusic:playlist:world', name=CHART_NAMES['world'])
+
+
+def chart_ref(chart_type):
+    return Ref.playlist(uri=f'ymusic:playlist:{chart_type}', name=CHART_NAMES.get(chart_type, f'Top 100 {chart_type}'))
 
 
 class YMusicPlaylistsProvider(PlaylistsProvider):
-    chart_types = ('world',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chart_types = tuple(self.backend.config['ymusic']['charts'])
 
     def as_list(self):
-        result = [WORLD_TOP_100]
+        charts = [chart_ref(chart_type) for chart_type in self.chart_types]
+        result = [*charts, *self.backend.radio.as_list(), *self.backend.sync.as_list()]
         return result
 
-    @lru_cache(maxsize=64)
+    def refresh(self):
+        logger.info('playlists.refresh')
+        for kind in ('event', 'chart', 'playlist'):
+            self.backend.cache.invalidate(kind=kind)
+        self.backend.sync.sync()
+
+    def cache_kind(self, playlist_id):
+        if playlist_id.startswith('event'):
+            return 'event'
+        if playlist_id in self.chart_types:
+            return 'chart'
+        return 'playlist'
+
     def get(self, playlist_id) -> Playlist:
+        uri = f'ymusic:playlist:{playlist_id}'
+        return self.backend.cache.get_or_load(
+            self.cache_kind(playlist_id), uri, lambda: self._get(playlist_id), op='playlist',
+        )
+
+    def _fetch(self, playlist_id):
+        """The yandex_music playlist or feed event behind ``playlist_id``, :obj:`None` if it is gone."""
         if playlist_id.startswith('event'):
             _, event_id = playlist_id.split(':', 1)
-            event = self.backend.library.get_feed_event(event_id)
-            tracks = [to_model(track) for track in event.tracks]
-            return Playlist(
-                uri=f'ymusic:playlist:event:{event_id}',
-                name=event.title,
-                tracks=tracks,
-            )
-
+            return self.backend.library.get_feed_event(event_id)
         if playlist_id in self.chart_types:
-            playlist = self.backend.client.chart(playlist_id).chart
-        else:
-            playlist = self.backend.client.playlists_list([playlist_id])[0]
+            return self.backend.client.chart(playlist_id).chart
+        return self.backend.client.playlists_list([playlist_id])[0]
 
-        return to_model(playlist)
+    def _get_synced(self, playlist_id):
+        """The synced user playlist with ``playlist_id``, never syncing for charts and feed events."""
+        if self.cache_kind(playlist_id) != 'playlist':
+            return None
+        return self.backend.sync.get_playlist(f'ymusic:playlist:{playlist_id}')
+
+    def _get(self, playlist_id) -> Playlist:
+        synced = self._get_synced(playlist_id)
+        if synced is not None:
+            looked_up = self.backend.library.lookup_many([ref.uri for ref in synced.tracks])
+            tracks = [track for ref in synced.tracks for track in looked_up[ref.uri]]
+            return Playlist(uri=synced.ref.uri, name=synced.ref.name, tracks=tracks)
+
+        source = self._fetch(playlist_id)
+        if source is None:
+            return None
+        return self._to_playlist(playlist_id, source)
+
+    def _to_playlist(self, playlist_id, source):
+        with self.backend.metrics.timer('convert', 'playlist'):
+            if playlist_id.startswith('event'):
+                playlist = Playlist(
+                    uri=f'ymusic:playlist:{playlist_id}',
+                    name=source.title,
+                    tracks=[to_model(track) for track in source.tracks],
+                )
+            else:
+                playlist = to_model(source)
+        self.backend.index.add(playlist.tracks)
+        return playlist
 
     def get_items(self, uri):
         _, ref_type, playlist_id = uri.split(':', 2)
         if ref_type != 'playlist':
             return None
 
-        playlist = self.get(playlist_id)
-        return [Ref.track(uri=track.uri, name=track.name) for track in playlist.tracks]
+        if uri == self.backend.radio.ref.uri and self.backend.radio.enabled:
+            return [Ref.track(uri=track.uri, name=track.name) for track in self.backend.radio.tracks()]
+
+        synced = self._get_synced(playlist_id)
+        if synced is not None:
+            return list(synced.tracks)
+
+        return self.backend.cache.get_or_load(
+            self.cache_kind(playlist_id), uri, lambda: self._get_refs(playlist_id), op='refs',
+        )
+
+    def _get_refs(self, playlist_id):
+        """Track refs of the playlist, built without converting the full track models."""
+        source = self._fetch(playlist_id)
+        if source is None:
+            return None
+        return [to_ref(track) for track in source.tracks]
+
+    def warm_up_chart(self, chart_type):
+        """Fetch the chart and cache its playlist and ref list, returning the URIs of the chart and its tracks."""
+        uri = chart_ref(chart_type).uri
+        source = self._fetch(chart_type)
+        refs = [to_ref(track) for track in source.tracks]
+        self.backend.cache.set('chart', uri, self._to_playlist(chart_type, source), op='playlist')
+        self.backend.cache.set('chart', uri, refs, op='refs')
+        return [uri, *(ref.uri for ref in refs)]
 
     def lookup(self, uri):
         logger.info(f'playlists.lookup: {uri}')
         _, ref_type, playlist_id = uri.split(':', 2)
         if ref_type != 'playlist':
             return None
+        if uri == self.backend.radio.ref.uri and self.backend.radio.enabled:
+            return self.backend.radio.playlist()
         return self.get(playlist_id)
@@ -0,0 +1,205 @@
+import collections
+import logging
+import threading
+import time
+
+import pykka
+from mopidy.models import Playlist, Ref
+
+from .models import to_model
+
+
+logger = logging.getLogger(__name__)
+
+
+MY_WAVE = 'user:onyourwave'
+RADIO_URI = 'ymusic:playlist:radio'
+RADIO_FROM = 'mopidy-ymusic'
+FEEDBACK_BATCH = 5
+FEEDBACK_INTERVAL = 60
+SKIP_MARGIN_MS = 5000
+CORE_TIMEOUT = 5
+
+
+class Radio:
+    """Rotor station played as an endless playlist.
+
+    The playlist holds the next ``radio_buffer`` station tracks, with their
+    metadata cached and direct links resolved. Nothing is fetched before the
+    playlist is first opened. When one of the buffered tracks starts, it
+    leaves the buffer along with the ones before it, the buffer is refilled on
+    a background thread and the new tracks are appended to the tracklist, so
+    track changes never wait for the station. The same thread resolves the
+    links of the buffered tracks again before ``link_ttl`` runs out, and sends
+    play and skip feedback in batches of ``FEEDBACK_BATCH``, or every
+    ``FEEDBACK_INTERVAL`` seconds.
+    """
+
+    def __init__(self, backend):
+        config = backend.config['ymusic']
+        self.backend = backend
+        self.station = config['radio_station']
+        self.size = config['radio_buffer']
+        self.link_refresh = config['link_ttl'] / 2
+        self.interval = max(1, min(FEEDBACK_INTERVAL, config['link_ttl'] / 4))
+        self.ref = Ref.playlist(uri=RADIO_URI, name='My Wave' if self.station == MY_WAVE else f'Radio {self.station}')
+        self.buffer = collections.deque()
+        self.batches = collections.deque()
+        self.feedback = []
+        self._resolved_at = {}
+        self._queue_id = None
+        self._playing = None
+        self._playing_batch = None
+        self._started = False
+        self._advanced = False
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._fill_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return bool(self.station)
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='YMusicRadio', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(CORE_TIMEOUT)
+        self._thread = None
+
+    def as_list(self):
+        return [self.ref] if self.enabled else []
+
+    def tracks(self):
+        """The buffered tracks, waiting for the station only when the buffer is empty."""
+        if not self.buffer:
+            self._fill()
+        with self._lock:
+            tracks = list(self.buffer)
+            if not self._started:
+                self._started = True
+                self._add_feedback('radioStarted', from_=RADIO_FROM)
+        self._wake.set()
+        return tracks
+
+    def playlist(self):
+        return Playlist(uri=self.ref.uri, name=self.ref.name, tracks=self.tracks())
+
+    def track_changed(self, track, position):
+        """Queue feedback for the station tracks involved in a change of the playing track to ``track``.
+
+        The previous track gets ``trackFinished`` feedback, or ``skip`` when it
+        was left at ``position`` milliseconds before its end. A buffered track
+        gets ``trackStarted`` and leaves the buffer with the ones before it.
+        Batch ids are kept per buffered entry, as a station may repeat a track.
+        """
+        with self._lock:
+            previous, batch_id = self._playing, self._playing_batch
+            self._playing, self._playing_batch = track, None
+            if previous is not None and batch_id is not None:
+                length = previous.length or 0
+                played = length if position is None else position
+                type_ = 'skip' if played < length - SKIP_MARGIN_MS else 'trackFinished'
+                self._add_feedback(type_, previous.uri, batch_id, total_played_seconds=played / 1000)
+            uris = [model.uri for model in self.buffer]
+            if track.uri in uris:
+                for _ in range(uris.index(track.uri) + 1):
+                    uri = self.buffer.popleft().uri
+                    self._playing_batch = self.batches.popleft()
+                    if uri not in uris[uris.index(track.uri) + 1:]:
+                        self._resolved_at.pop(uri, None)
+                self._add_feedback('trackStarted', track.uri, self._playing_batch)
+                self._advanced = True
+        self._wake.set()
+
+    def _add_feedback(self, type_, uri=None, batch_id=None, **kwargs):
+        if uri is not None:
+            kwargs.update(track_id=uri.split(':')[2], batch_id=batch_id)
+        self.feedback.append({'type_': type_, 'timestamp': time.time(), **kwargs})
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            if self._started:
+                try:
+                    self._fill()
+                    self._hand_out()
+                    self._refresh_links()
+                except Exception:
+                    logger.exception(f'Failed to refill radio {self.station}')
+            self._flush(force=False)
+        self._flush(force=True)
+
+    def _fill(self):
+        """Fetch station tracks until ``radio_buffer`` of them are ready."""
+        with self._fill_lock:
+            while len(self.buffer) < self.size:
+                result = self.backend.client.rotor_station_tracks(self.station, queue=self._queue_id)
+                tracks = [item.track for item in (result.sequence if result else []) if item.track is not None]
+                if not tracks:
+                    logger.warning(f'Radio {self.station} returned no tracks')
+                    return
+                models = [to_model(track) for track in tracks]
+                self.backend.index.add(models)
+                for model in models:
+                    self.backend.cache.set('track', model.uri, [model], op='lookup')
+                    self.backend.playback.resolve(model.uri)
+                with self._lock:
+                    self.batches.extend(result.batch_id for _ in models)
+                    self._resolved_at.update((model.uri, time.monotonic()) for model in models)
+                    self.buffer.extend(models)
+                self._queue_id = tracks[-1].id
+                logger.debug(f'Radio {self.station} buffered {len(self.buffer)} tracks')
+
+    def _hand_out(self):
+        """Append the buffered tracks missing from the tracklist once a buffered track started."""
+        with self._lock:
+            advanced, self._advanced = self._advanced, False
+            uris = [model.uri for model in self.buffer]
+        cores = pykka.ActorRegistry.get_by_class_name('Core')
+        if not advanced or not uris or not cores:
+            return
+        tracklist = cores[0].proxy().tracklist
+        listed = {track.uri for track in tracklist.get_tracks().get(CORE_TIMEOUT)}
+        missing = [uri for uri in uris if uri not in listed]
+        if missing:
+            tracklist.add(uris=missing).get(CORE_TIMEOUT)
+
+    def _refresh_links(self):
+        """Resolve the links of the buffered tracks again once they are half way to ``link_ttl``."""
+        now = time.monotonic()
+        with self._lock:
+            uris = [uri for uri, resolved_at in self._resolved_at.items() if now - resolved_at >= self.link_refresh]
+        for uri in uris:
+            self.backend.playback.resolve(uri, refresh=True)
+            with self._lock:
+                if uri in self._resolved_at:
+                    self._resolved_at[uri] = time.monotonic()
+
+    def _flush(self, force):
+        with self._lock:
+            due = len(self.feedback) >= FEEDBACK_BATCH or time.monotonic() - self._flushed_at >= FEEDBACK_INTERVAL
+            if not self.feedback or not (due or force):
+                return
+            feedback, self.feedback = self.feedback, []
+            self._flushed_at = time.monotonic()
+
+        for kwargs in feedback:
+            try:
+                self.backend.client.rotor_station_feedback(self.station, **kwargs)
+            except Exception as e:
+                logger.warning(f'Failed to send {kwargs["type_"]} feedback to radio {self.station}: {e}')
@@ -0,0 +1,153 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from mopidy.models import ModelJSONEncoder, model_json_decoder
+
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA_VERSION = 1
+FLUSH_INTERVAL = 1
+FLUSH_SIZE = 500
+PRUNE_INTERVAL = 3600
+
+
+class MetadataStore:
+    """SQLite file holding converted ``mopidy.models`` objects between restarts.
+
+    Every entry keeps the time it was written, so callers can tell whether it
+    is stale. A database written with another ``SCHEMA_VERSION`` is dropped.
+
+    Writes are kept in memory and committed by a background thread in one
+    transaction, every ``FLUSH_INTERVAL`` seconds or once ``FLUSH_SIZE`` of
+    them are waiting. Entries older than ``ttl`` seconds and the oldest ones
+    beyond ``maxsize`` are removed at startup and every ``PRUNE_INTERVAL``.
+    """
+
+    def __init__(self, path, ttl=None, maxsize=None):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._migrate()
+        self.prune()
+
+    def _migrate(self):
+        with self._lock, self._db:
+            version, = self._db.execute('PRAGMA user_version').fetchone()
+            if version == SCHEMA_VERSION:
+                return
+            logger.info(f'Recreating metadata store {self.path}: schema {version} -> {SCHEMA_VERSION}')
+            self._db.execute('DROP TABLE IF EXISTS entries')
+            self._db.execute(
+                'CREATE TABLE entries ('
+                '  kind TEXT NOT NULL,'
+                '  uri TEXT NOT NULL,'
+                '  op TEXT NOT NULL,'
+                '  data TEXT NOT NULL,'
+                '  updated_at REAL NOT NULL,'
+                '  PRIMARY KEY (kind, uri, op)'
+                ')'
+            )
+            self._db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def get(self, kind, uri, op=None):
+        """Return ``(value, updated_at)`` for the entry or :obj:`None`."""
+        with self._pending_lock:
+            row = self._pending.get((kind, uri, op or ''))
+        if row is None:
+            with self._lock:
+                row = self._db.execute(
+                    'SELECT data, updated_at FROM entries WHERE kind = ? AND uri = ? AND op = ?',
+                    (kind, uri, op or ''),
+                ).fetchone()
+        if row is None:
+            return None
+        data, updated_at = row
+        return json.loads(data, object_hook=model_json_decoder), updated_at
+
+    def set(self, kind, uri, value, op=None):
+        data = json.dumps(value, cls=ModelJSONEncoder)
+        with self._pending_lock:
+            self._pending[(kind, uri, op or '')] = (data, time.time())
+            full = len(self._pending) >= FLUSH_SIZE
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = threading.Thread(target=self._run, name='YMusicStore', daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Commit the waiting writes in one transaction."""
+        with self._lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            with self._db:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO entries (kind, uri, op, data, updated_at) VALUES (?, ?, ?, ?, ?)',
+                    [(*key, data, updated_at) for key, (data, updated_at) in pending.items()],
+                )
+        logger.debug(f'Stored {len(pending)} metadata entries')
+
+    def prune(self):
+        """Remove the entries older than ``ttl`` and the oldest ones beyond ``maxsize``."""
+        with self._lock, self._db:
+            before = self._db.total_changes
+            if self.ttl:
+                self._db.execute('DELETE FROM entries WHERE updated_at < ?', (time.time() - self.ttl,))
+            if self.maxsize:
+                self._db.execute(
+                    'DELETE FROM entries WHERE rowid IN '
+                    '(SELECT rowid FROM entries ORDER BY updated_at DESC LIMIT -1 OFFSET ?)',
+                    (self.maxsize,),
+                )
+            removed = self._db.total_changes - before
+        if removed:
+            logger.info(f'Pruned {removed} entries from metadata store {self.path}')
+
+    def invalidate(self, kind=None, uri=None):
+        conditions = {'kind': kind, 'uri': uri}
+        where = ' AND '.join(f'{column} = ?' for column, value in conditions.items() if value is not None)
+        params = [value for value in conditions.values() if value is not None]
+        with self._lock, self._db:
+            with self._pending_lock:
+                self._pending = {
+                    key: row for key, row in self._pending.items()
+                    if kind not in (None, key[0]) or uri not in (None, key[1])
+                }
+            self._db.execute('DELETE FROM entries' + (f' WHERE {where}' if where else ''), params)
+
+    def _run(self):
+        pruned_at = time.monotonic()
+        while not self._stopped.is_set():
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+                if time.monotonic() - pruned_at >= PRUNE_INTERVAL:
+                    pruned_at = time.monotonic()
+                    self.prune()
+            except sqlite3.Error:
+                logger.exception(f'Failed to write metadata store {self.path}')
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._lock:
+            self._db.close()
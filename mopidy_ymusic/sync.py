@@ -0,0 +1,155 @@
+import collections
+import logging
+import threading
+
+from mopidy.models import Ref
+
+from .library import LOOKUP_CHUNK_SIZE, chunked
+from .models import RefType, to_model, to_ref, to_uri
+
+
+logger = logging.getLogger(__name__)
+
+
+LIBRARY_DIR = Ref.directory(uri=f'ymusic:{RefType.DIRECTORY.value}:library', name='My Music')
+LIKED_ALBUMS_DIR = Ref.directory(uri=f'{LIBRARY_DIR.uri}:albums', name='Liked albums')
+LIKED_TRACKS = Ref.playlist(uri=f'ymusic:{RefType.PLAYLIST.value}:likes', name='Liked tracks')
+STATE_KIND = 'library'
+
+SyncedPlaylist = collections.namedtuple('SyncedPlaylist', 'revision ref tracks')
+
+
+class LibrarySync:
+    """The account's own playlists, liked tracks and liked albums.
+
+    Liked tracks and playlists carry revision numbers. A sync downloads only
+    the playlists whose revision changed and only the liked tracks not seen
+    before. With a metadata store the synced state survives restarts, so the
+    first sync after a restart is incremental too.
+    """
+
+    root_directory = LIBRARY_DIR
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.enabled = backend.config['ymusic']['user_library']
+        self.synced = False
+        self.likes = SyncedPlaylist(None, LIKED_TRACKS, [])
+        self.playlists = {}
+        self.albums = []
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        store = self.backend.cache.store
+        stored = store.get(STATE_KIND, LIBRARY_DIR.uri) if store is not None else None
+        if stored is None:
+            return
+        state, _ = stored
+        self.likes = SyncedPlaylist(*state['likes'])
+        self.playlists = {playlist[1].uri: SyncedPlaylist(*playlist) for playlist in state['playlists']}
+        self.albums = state['albums']
+
+    def _save(self):
+        store = self.backend.cache.store
+        if store is None:
+            return
+        state = {'likes': self.likes, 'playlists': list(self.playlists.values()), 'albums': self.albums}
+        store.set(STATE_KIND, LIBRARY_DIR.uri, state)
+
+    def ensure(self):
+        """Sync on first use, later syncs happen on refresh."""
+        if not self.synced:
+            self.synced = True
+            self.sync()
+
+    def sync(self):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            try:
+                changed = [*self._sync_likes(), *self._sync_playlists()]
+                self.albums = self._get_liked_albums()
+            except Exception:
+                logger.exception('Failed to sync the user library')
+                return
+            self.synced = True
+            self._save()
+
+        for uri in changed:
+            self.backend.cache.invalidate(uri=uri)
+        logger.info(f'User library synced: {len(self.playlists)} playlists, {len(self.likes.tracks)} liked tracks, '
+                    f'{len(self.albums)} liked albums, {len(changed)} changed')
+
+    def _sync_likes(self):
+        client = self.backend.client
+        result = client.users_likes_tracks(if_modified_since_revision=self.likes.revision or 0)
+        if result is None or result.revision == self.likes.revision:
+            return []
+
+        known = {ref.uri: ref for ref in self.likes.tracks}
+        uris = [f'ymusic:{RefType.TRACK.value}:{short.id}' for short in result.tracks]
+        missing = [uri.rsplit(':', 1)[1] for uri in uris if uri not in known]
+        for chunk in chunked(missing, LOOKUP_CHUNK_SIZE):
+            tracks = client.tracks(chunk)
+            known.update((ref.uri, ref) for ref in map(to_ref, tracks))
+            self.backend.index.add(to_model(track) for track in tracks)
+
+        self.likes = SyncedPlaylist(result.revision, LIKED_TRACKS, [known[uri] for uri in uris if uri in known])
+        return [LIKED_TRACKS.uri]
+
+    def _sync_playlists(self):
+        client = self.backend.client
+        playlists = {}
+        changed = []
+        for playlist in client.users_playlists_list():
+            uri = to_uri(playlist)
+            synced = self.playlists.get(uri)
+            if synced is not None and synced.revision == playlist.revision:
+                playlists[uri] = synced._replace(ref=Ref.playlist(uri=uri, name=playlist.title))
+            else:
+                changed.append(playlist.playlist_id)
+
+        for chunk in chunked(changed, LOOKUP_CHUNK_SIZE):
+            for playlist in client.playlists_list(chunk):
+                uri = to_uri(playlist)
+                shorts = [short for short in playlist.tracks or [] if short.track is not None]
+                self.backend.index.add(to_model(short) for short in shorts)
+                tracks = [to_ref(short) for short in shorts]
+                playlists[uri] = SyncedPlaylist(playlist.revision, Ref.playlist(uri=uri, name=playlist.title), tracks)
+
+        removed = set(self.playlists) - set(playlists)
+        self.playlists = playlists
+        return [f'ymusic:{RefType.PLAYLIST.value}:{playlist_id}' for playlist_id in changed] + sorted(removed)
+
+    def _get_liked_albums(self):
+        albums = [like.album for like in self.backend.client.users_likes_albums() if like.album is not None]
+        self.backend.index.add(to_model(album) for album in albums)
+        return [to_ref(album) for album in albums]
+
+    def get_playlist(self, uri):
+        """The synced playlist behind ``uri`` or :obj:`None`."""
+        if not self.enabled:
+            return None
+        self.ensure()
+        if uri == LIKED_TRACKS.uri:
+            return self.likes
+        return self.playlists.get(uri)
+
+    def as_list(self):
+        if not self.enabled:
+            return []
+        self.ensure()
+        return [LIKED_TRACKS, *(playlist.ref for playlist in self.playlists.values())]
+
+    def browse(self, uri):
+        """Refs under the library directories, :obj:`None` for other URIs."""
+        if not self.enabled:
+            return None
+        if uri == LIBRARY_DIR.uri:
+            return [*self.as_list(), LIKED_ALBUMS_DIR]
+        if uri == LIKED_ALBUMS_DIR.uri:
+            self.ensure()
+            return list(self.albums)
+        return None
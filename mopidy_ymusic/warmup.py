@@ -0,0 +1,77 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+logger = logging.getLogger(__name__)
+
+STOP_TIMEOUT = 5
+
+
+class WarmUp:
+    """Keeps the feed, the root browse tree, the charts, the user library and their artwork cached.
+
+    Runs at startup and then every ``warmup_interval`` seconds, each run
+    delayed by up to ``warmup_jitter`` seconds so that several instances do
+    not call the API at the same moment. The feed, every chart and the user
+    library are fetched on ``warmup_workers`` threads, the artwork afterwards.
+    An interval of 0 disables the startup run too.
+    """
+
+    def __init__(self, backend):
+        config = backend.config['ymusic']
+        self.backend = backend
+        self.interval = config['warmup_interval']
+        self.jitter = config['warmup_jitter']
+        self.workers = config['warmup_workers']
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.interval or self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='YMusicWarmUp', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the runs, waiting up to ``STOP_TIMEOUT`` seconds for one in progress to finish."""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join(STOP_TIMEOUT)
+        self._thread = None
+
+    def _run(self):
+        delay = random.uniform(0, self.jitter)
+        while not self._stopped.wait(delay):
+            try:
+                self.run()
+            except Exception:
+                logger.exception('Warm-up failed')
+            delay = self.interval + random.uniform(0, self.jitter)
+
+    def run(self):
+        started = time.monotonic()
+        library, playlists = self.backend.library, self.backend.playlists
+        uris = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='YMusicWarmUp') as executor:
+            futures = [
+                executor.submit(library.warm_up),
+                executor.submit(self._sync_library),
+                *(executor.submit(playlists.warm_up_chart, chart_type) for chart_type in playlists.chart_types),
+            ]
+            for future in as_completed(futures):
+                try:
+                    uris.extend(future.result())
+                except Exception:
+                    logger.exception('Failed to warm up the feed, a chart or the user library')
+        library.get_images(uris)
+        logger.info(f'Warmed up {len(uris)} URIs in {time.monotonic() - started:.1f}s')
+
+    def _sync_library(self):
+        sync = self.backend.sync
+        sync.sync()
+        return [ref.uri for ref in sync.as_list()]
@@ -0,0 +1,79 @@
+import hashlib
+import logging
+import re
+from urllib.parse import urlsplit
+
+import tornado.web
+
+from .metrics import published
+
+
+logger = logging.getLogger(__name__)
+
+
+IMAGES_PATH = '/ymusic/images/'
+IMAGE_HOSTS = ('yandex.net', 'yandex.ru', 'yastatic.net')
+HOST_RE = re.compile(r'[a-z0-9.-]+')
+IMAGE_MAX_AGE = 7 * 24 * 3600
+PNG_SIGNATURE = b'\x89PNG'
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def image_filename(url):
+    return hashlib.sha1(url.encode()).hexdigest()
+
+
+def local_image_uri(url):
+    """URI of the image at ``https`` ``url`` served by :class:`ImageHandler`."""
+    return IMAGES_PATH + url.split('://', 1)[1]
+
+
+def is_image_host(host):
+    """Whether ``host`` is a plain host name of one of the ``IMAGE_HOSTS``, without a user, port or separators."""
+    if HOST_RE.fullmatch(host) is None:
+        return False
+    return any(host == allowed or host.endswith(f'.{allowed}') for allowed in IMAGE_HOSTS)
+
+
+class ImageHandler(tornado.web.RequestHandler):
+    """Serves artwork from the image cache, redirects to Yandex for images not downloaded yet."""
+
+    def initialize(self, path):
+        self.path = path
+
+    def get(self, remote):
+        url = f'https://{remote}'
+        if not is_image_host(urlsplit(url).netloc):
+            raise tornado.web.HTTPError(404)
+
+        if self.request.query:
+            url = f'{url}?{self.request.query}'
+        try:
+            data = (self.path / image_filename(url)).read_bytes()
+        except FileNotFoundError:
+            self.redirect(url)
+            return
+
+        self.set_header('Content-Type', 'image/png' if data.startswith(PNG_SIGNATURE) else 'image/jpeg')
+        self.set_header('Cache-Control', f'max-age={IMAGE_MAX_AGE}')
+        self.write(data)
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """Serves the backend metrics in the Prometheus text format."""
+
+    def get(self):
+        metrics = published()
+        if metrics is None:
+            raise tornado.web.HTTPError(503)
+
+        self.set_header('Content-Type', METRICS_CONTENT_TYPE)
+        self.write(metrics.render())
+
+
+def factory(config, core):
+    from . import Extension
+    return [
+        (r'/images/(.+)', ImageHandler, {'path': Extension.get_cache_dir(config) / 'image'}),
+        (r'/metrics', MetricsHandler),
+    ]
@@ -1,3 +1,5 @@
+import http.server
+import threading
 from unittest import mock
 
 import pytest
@@ -12,26 +14,73 @@ from yandex_music import (
     AlbumEvent,
     Artist,
     ArtistEvent,
+    ArtistTracks,
     ChartInfo,
     Cover,
     Day,
     DownloadInfo,
     Event,
     Feed,
+    Like,
+    Pager,
     Playlist,
     Search,
     SearchResult,
     Track,
     TrackShort,
+    TracksList,
+    User,
 )
 
 from mopidy_ymusic.backend import YMusicBackend
+from mopidy_ymusic.client import SingleFlightClient
 from mopidy_ymusic.playlist import YMusicPlaylistsProvider
 
 
 @pytest.fixture
 def config():
-    return {'ymusic': {'token': '', 'bitrate': 128}}
+    return {
+        'ymusic': {
+            'token': '',
+            'base_url': None,
+            'bitrate': 128,
+            'codecs': ['mp3', 'aac'],
+            'link_ttl': 300,
+            'audio_cache_size': 0,
+            'prefetch_count': 2,
+            'cache_ttl': [('feed', 900), ('event', 900), ('album', 86400), ('artist', 86400), ('track', 86400)],
+            'cache_size': 1024,
+            'metadata_store': False,
+            'metadata_store_ttl': 2592000,
+            'metadata_store_size': 100000,
+            'image_size': '400x400',
+            'image_cache_size': 0,
+            'image_cache_sizes': ['200x200', '400x400'],
+            'charts': ['world'],
+            'browse_page_size': 100,
+            'artist_tracks_limit': 1000,
+            'user_library': True,
+            'search_remote': True,
+            'search_remote_wait': True,
+            'search_pages': 1,
+            'search_cache_ttl': 60,
+            'search_cache_size': 256,
+            'radio_station': None,
+            'radio_buffer': 2,
+            'warmup_interval': 0,
+            'warmup_jitter': 0,
+            'warmup_workers': 2,
+            'init_timeout': 1.0,
+            'workers': 2,
+            'pool_size': 4,
+            'connect_timeout': 1.0,
+            'read_timeout': 1.0,
+            'retries': 1,
+            'retry_backoff': 0.0,
+            'priorities': [('playback.prepare_change', 0), ('playback.change_track', 0), ('library.browse', 2)],
+            'metrics_interval': 0,
+        },
+    }
 
 
 @pytest.fixture
@@ -75,6 +124,22 @@ def playlist(track):
     )
 
 
+@pytest.fixture
+def user_playlist(track):
+    return Playlist(
+        uid=1000,
+        kind=3,
+        revision=1,
+        title='My Playlist',
+        tracks=[TrackShort(id=track.id, timestamp='', track=track)],
+        owner=User(uid=1000, login='user'),
+        cover=None,
+        made_for=None,
+        play_counter=None,
+        playlist_absence=None,
+    )
+
+
 @pytest.fixture
 def mopidy_artist(artist):
     return MopidyArtist(uri=f'ymusic:artist:{artist.id}', name=artist.name, sortname=artist.name)
@@ -130,7 +195,7 @@ def chart(playlist):
 
 
 @pytest.fixture
-def client(album, artist, track, playlist, tracks_event, chart):
+def client(album, artist, track, playlist, user_playlist, tracks_event, chart):
     client = mock.Mock()
     client.feed.return_value = Feed(
         days=[
@@ -174,7 +239,7 @@ def client(album, artist, track, playlist, tracks_event, chart):
 
     album.volumes = [[track]]
     client.albums_with_tracks.return_value = album
-    client.artists_tracks.return_value = [track]
+    client.artists_tracks.return_value = ArtistTracks(tracks=[track], pager=Pager(total=1, page=0, per_page=100))
     client.tracks.return_value = [track]
     client.artists.return_value = [artist]
     client.albums.return_value = [album]
@@ -199,18 +264,24 @@ def client(album, artist, track, playlist, tracks_event, chart):
     ]
 
     for info in infos:
-        info.direct_link = f'https://server.com/track/{info.bitrate_in_kbps}/{info.codec}'
+        info.get_direct_link = mock.Mock(return_value=f'https://server.com/track/{info.bitrate_in_kbps}/{info.codec}')
 
     client.tracks_download_info.return_value = infos
-    client.playlists_list.return_value = [playlist]
+    playlists = {playlist.uid: playlist, user_playlist.playlist_id: user_playlist}
+    client.playlists_list.side_effect = lambda ids: [playlists[playlist_id] for playlist_id in ids]
     client.chart.return_value = chart
+    client.users_likes_tracks.return_value = TracksList(
+        uid=1000, revision=1, tracks=[TrackShort(id=track.id, timestamp='')],
+    )
+    client.users_playlists_list.return_value = [user_playlist]
+    client.users_likes_albums.return_value = [Like(type='album', album=album)]
     return client
 
 
 @pytest.fixture
 def backend(config, client):
     backend = YMusicBackend(config, None)
-    backend.client = client
+    backend.client = SingleFlightClient(client, metrics=backend.metrics)
     return backend
 
 
@@ -227,3 +298,29 @@ def playback(backend):
 @pytest.fixture
 def playlists(backend) -> YMusicPlaylistsProvider:
     return backend.playlists
+
+
+@pytest.fixture
+def http_server():
+    responses = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, body = responses.pop(0)
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self.do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}', responses
+    server.shutdown()
@@ -1,6 +1,18 @@
-from mopidy.models import Image, Playlist, Ref
+import concurrent.futures
+import threading
+import time
+from unittest import mock
 
+from mopidy.models import Image, Playlist, Ref, TlTrack, Track as MopidyTrack
+from yandex_music import ArtistTracks, Pager, Track, TrackShort, TracksList
+from yandex_music.exceptions import NotFoundError
+
+from mopidy_ymusic.backend import YMusicBackend
+from mopidy_ymusic.playback import select_download_info
 from mopidy_ymusic.playlist import WORLD_TOP_100
+from mopidy_ymusic.store import MetadataStore
+from mopidy_ymusic.sync import LIBRARY_DIR, LIKED_ALBUMS_DIR, LIKED_TRACKS, LibrarySync
+from mopidy_ymusic.web import image_filename
 
 
 def test_library_root(library):
@@ -8,7 +20,8 @@ def test_library_root(library):
 
 
 def test_browse(library, album, track, artist, tracks_event):
-    album_event_ref, artist_event_ref, playlist_ref = library.browse(library.root_directory.uri)
+    album_event_ref, artist_event_ref, playlist_ref, library_ref = library.browse(library.root_directory.uri)
+    assert library_ref == LIBRARY_DIR
     assert album_event_ref == Ref.directory(uri='ymusic:directory:event-0001', name='Album Event')
     assert artist_event_ref == Ref.directory(uri='ymusic:directory:event-0002', name='Artist Event')
     assert playlist_ref == Ref.playlist(uri=f'ymusic:playlist:event:{tracks_event.id}', name=tracks_event.title)
@@ -26,6 +39,31 @@ def test_browse(library, album, track, artist, tracks_event):
     assert track_ref == Ref.track(uri=f'ymusic:track:{track.id}', name=track.title)
 
 
+def test_browse_pages(library, client, config, album, track):
+    config['ymusic']['browse_page_size'] = 2
+    config['ymusic']['artist_tracks_limit'] = 3
+    tracks = [Track(id=f'track-{index}', title=f'Track {index}', artists=track.artists, albums=[album])
+              for index in range(5)]
+    client.artists_tracks.side_effect = lambda artist_id, page, page_size: ArtistTracks(
+        tracks=tracks[page * page_size:(page + 1) * page_size],
+        pager=Pager(total=len(tracks), page=page, per_page=page_size),
+    )
+    album.volumes = [tracks[:3], tracks[3:]]
+
+    for uri in ('ymusic:artist:artist-0001', 'ymusic:album:album-0001'):
+        *track_refs, more = library.browse(uri)
+        assert [ref.uri for ref in track_refs] == ['ymusic:track:track-0', 'ymusic:track:track-1']
+        assert more == Ref.directory(uri=f'{uri}:1', name='More…')
+
+        *track_refs, more = library.browse(more.uri)
+        assert [ref.uri for ref in track_refs] == ['ymusic:track:track-2', 'ymusic:track:track-3']
+
+        assert [ref.uri for ref in library.browse(more.uri)] == ['ymusic:track:track-4']
+
+    assert [t.uri for t in library.lookup('ymusic:artist:artist-0001')] == [f'ymusic:track:track-{i}' for i in range(3)]
+    assert [call[1]['page'] for call in client.artists_tracks.call_args_list] == [0, 1, 2, 0, 1]
+
+
 def test_lookup(library, mopidy_album, mopidy_artist, mopidy_track):
     assert library.lookup(library.root_directory.uri) == []
     assert library.lookup(mopidy_artist.uri) == [mopidy_track]
@@ -33,6 +71,62 @@ def test_lookup(library, mopidy_album, mopidy_artist, mopidy_track):
     assert library.lookup(mopidy_track.uri) == [mopidy_track]
 
 
+def test_library_refresh(library, client, mopidy_album):
+    library.lookup(mopidy_album.uri)
+    library.lookup(mopidy_album.uri)
+    client.albums_with_tracks.assert_called_once()
+
+    library.refresh(mopidy_album.uri)
+    library.lookup(mopidy_album.uri)
+    assert client.albums_with_tracks.call_count == 2
+
+    library.browse(library.root_directory.uri)
+    library.refresh()
+    library.browse(library.root_directory.uri)
+    assert client.feed.call_count == 2
+
+
+def test_feed_refresh(library, client, tracks_event):
+    event_uri = event_as_playlist_uri(tracks_event)
+    assert library.get_feed_event(tracks_event.id) is tracks_event
+    assert event_uri in [ref.uri for ref in library.browse(library.root_directory.uri)]
+    client.feed.assert_called_once()
+
+    client.feed.return_value.days[0].events.remove(tracks_event)
+    with mock.patch('threading.Thread') as thread:
+        library._feed_loaded_at -= 900
+        assert library.get_feed_event(tracks_event.id) is tracks_event
+        thread.return_value.start.assert_called_once()
+        thread.call_args[1]['target']()
+
+    assert client.feed.call_count == 2
+    assert library.get_feed_event(tracks_event.id) is None
+    assert event_uri not in [ref.uri for ref in library.browse(library.root_directory.uri)]
+    assert library.browse('ymusic:directory:event-0003') == []
+    assert library.get_images([event_uri]) == {}
+
+
+def test_lookup_many(library, client, track, mopidy_album, mopidy_artist, mopidy_track):
+    missing_uri = 'ymusic:track:track-0002'
+    result = library.lookup_many([mopidy_track.uri, missing_uri, mopidy_album.uri, mopidy_artist.uri])
+    assert result == {
+        mopidy_track.uri: [mopidy_track],
+        missing_uri: [],
+        mopidy_album.uri: [mopidy_track],
+        mopidy_artist.uri: [mopidy_track],
+    }
+    client.tracks.assert_called_once_with([track.id, 'track-0002'])
+
+
+def test_lookup_many_isolates_failures(library, client, mopidy_album, mopidy_artist, mopidy_track):
+    client.albums_with_tracks.side_effect = NotFoundError('gone')
+    result = library.lookup_many([mopidy_track.uri, mopidy_album.uri, mopidy_artist.uri])
+    assert result == {mopidy_track.uri: [mopidy_track], mopidy_album.uri: [], mopidy_artist.uri: [mopidy_track]}
+
+    client.albums_with_tracks.side_effect = None
+    assert library.lookup_many([mopidy_album.uri]) == {mopidy_album.uri: [mopidy_track]}
+
+
 def test_search(library, client, mopidy_album, mopidy_artist, mopidy_track):
     def assert_result(result):
         assert result.uri == 'ymusic:search'
@@ -41,19 +135,19 @@ def test_search(library, client, mopidy_album, mopidy_artist, mopidy_track):
         assert result.tracks == (mopidy_track,)
 
     result = library.search({'any': ['AnyText']}, [])
-    client.search.assert_called_with('AnyText', type_='all')
+    client.search.assert_called_with('AnyText', type_='all', page=0)
     assert_result(result)
 
     result = library.search({'artist': ['Artist']}, [])
-    client.search.assert_called_with('Artist', type_='artist')
+    client.search.assert_called_with('Artist', type_='artist', page=0)
     assert_result(result)
 
     result = library.search({'album': ['Album']}, [])
-    client.search.assert_called_with('Album', type_='album')
+    client.search.assert_called_with('Album', type_='album', page=0)
     assert_result(result)
 
     result = library.search({'track': ['Track']}, [])
-    client.search.assert_called_with('Track', type_='track')
+    client.search.assert_called_with('Track', type_='track', page=0)
     assert_result(result)
 
     client.search.reset_mock()
@@ -64,6 +158,78 @@ def test_search(library, client, mopidy_album, mopidy_artist, mopidy_track):
     assert result.artists == ()
 
 
+def test_search_fields(library, client, config, album, artist, track, mopidy_track):
+    other = Track(id='track-0002', title='Track 02 Title', artists=[], albums=[album])
+    client.search.return_value.tracks.results = [other, track]
+    config['ymusic']['search_pages'] = 2
+
+    result = library.search({'track_name': ['Title'], 'artist': ['Artist 01']}, ['ymusic:'])
+    assert client.search.call_count == 4
+    client.search.assert_any_call('Title', type_='track', page=1)
+    client.search.assert_any_call('Artist 01', type_='artist', page=0)
+    assert [track.uri for track in result.tracks] == [mopidy_track.uri, 'ymusic:track:track-0002']
+
+
+def test_search_cache(library, client, mopidy_track):
+    assert library.search({'any': ['Track 01']}, []).tracks == (mopidy_track,)
+    assert library.search({'any': ['  track   01 ']}, []).tracks == (mopidy_track,)
+    client.search.assert_called_once_with('Track 01', type_='all', page=0)
+    assert library.search_cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_search_superseded(library, client):
+    release = threading.Event()
+    result = client.search.return_value
+
+    def search(text, type_, page):
+        if text == 'Tra':
+            release.wait(5)
+        return result
+
+    client.search.side_effect = search
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        first = executor.submit(library.search, {'any': ['Tra']}, [])
+        while not client.search.called:
+            time.sleep(0.01)
+        assert library.search({'any': ['Trac']}, []).tracks
+        assert first.result(timeout=1).tracks == ()
+        release.set()
+    assert library.backend.metrics.counters['searches_superseded'] == 1
+    assert 'ymusic_searches_superseded_total 1' in library.backend.metrics.render().splitlines()
+
+
+def test_search_other_backends(library, client):
+    assert library.search({'any': ['Track']}, ['local:directory']) is None
+    client.search.assert_not_called()
+
+
+def test_search_local_index(library, client, mopidy_album, mopidy_track):
+    library.lookup(mopidy_album.uri)
+    client.search.side_effect = Exception('Network is unreachable')
+
+    assert library.search({'track_name': ['track 01']}, []).tracks == (mopidy_track,)
+    client.search.reset_mock()
+    assert library.search({'track_name': [mopidy_track.name]}, [], exact=True).tracks == (mopidy_track,)
+    client.search.assert_not_called()
+
+
+def test_search_remote_in_background(library, client, config, mopidy_track):
+    config['ymusic']['search_remote_wait'] = False
+    with mock.patch('threading.Thread') as thread:
+        assert library.search({'any': ['Track 01']}, []).tracks == ()
+        client.search.assert_not_called()
+    thread.call_args[1]['target'](*thread.call_args[1]['args'])
+
+    client.search.assert_called_once_with('Track 01', type_='all', page=0)
+    assert library.search({'any': ['Track 01']}, []).tracks == (mopidy_track,)
+
+
+def test_search_without_remote(library, client, config):
+    config['ymusic']['search_remote'] = False
+    assert library.search({'any': ['Track']}, []).tracks == ()
+    client.search.assert_not_called()
+
+
 def event_as_playlist_uri(event):
     return f'ymusic:playlist:event:{event.id}'
 
@@ -87,13 +253,189 @@ def test_get_images(library, mopidy_artist, mopidy_album, mopidy_track, mopidy_p
     assert images[event_uri] == [Image(uri='https://images.com/track/cover.jpg?size=400x400')]
 
 
+def test_get_images_batched_and_cached(library, client, config, mopidy_track, mopidy_album):
+    config['ymusic']['image_size'] = '200x200'
+    missing_uri = 'ymusic:track:track-0002'
+    images = library.get_images([mopidy_track.uri, missing_uri, mopidy_album.uri])
+    assert images == {
+        mopidy_track.uri: [Image(uri='https://images.com/track/cover.jpg?size=200x200')],
+        mopidy_album.uri: [Image(uri='https://images.com/album/cover.jpg?size=200x200')],
+    }
+    client.tracks.assert_called_once_with([mopidy_track.uri.split(':')[-1], 'track-0002'])
+
+    assert library.get_images([mopidy_track.uri, mopidy_album.uri]) == images
+    client.tracks.assert_called_once()
+    client.albums.assert_called_once()
+
+
+def test_get_images_cached(library, mopidy_album):
+    library.backend.image_cache = image_cache = mock.Mock()
+    image_cache.get.side_effect = [None, 'cached']
+    url = 'https://images.com/album/cover.jpg?size=200x200'
+
+    assert library.get_images([mopidy_album.uri])[mopidy_album.uri] == [
+        Image(uri='/ymusic/images/images.com/album/cover.jpg?size=200x200', width=200, height=200),
+        Image(uri='/ymusic/images/images.com/album/cover.jpg?size=400x400', width=400, height=400),
+    ]
+    image_cache.download.assert_called_once_with(image_filename(url), url)
+
+
+def test_get_images_skips_likes_and_isolates_failures(library, client, mopidy_track, mopidy_album, mopidy_playlist):
+    client.albums.side_effect = RuntimeError('albums failed')
+    user_playlist_uri = 'ymusic:playlist:1000:3'
+    images = library.get_images([
+        LIKED_TRACKS.uri, mopidy_playlist.uri, user_playlist_uri, mopidy_track.uri, mopidy_album.uri,
+    ])
+    client.playlists_list.assert_called_once_with(['playlist-0001', '1000:3'])
+    assert set(images) == {mopidy_playlist.uri, mopidy_track.uri}
+
+
+def test_chart_items_skip_user_library(playlists, client):
+    client.users_playlists_list.reset_mock()
+    assert playlists.get_items(WORLD_TOP_100.uri)
+    assert playlists.lookup(WORLD_TOP_100.uri)
+    client.users_playlists_list.assert_not_called()
+
+
 def test_playback(playback, client, track, mopidy_track):
     assert playback.translate_uri(mopidy_track.uri) == 'https://server.com/track/128/mp3'
-    client.tracks_download_info.assert_called_with(track.id, get_direct_links=True)
+    client.tracks_download_info.assert_called_with(track.id)
+
+
+def test_select_download_info(client):
+    infos = client.tracks_download_info.return_value
+    assert select_download_info(infos, ['mp3'], 320) is infos[3]
+    assert select_download_info(infos, ['mp3'], 192) is infos[2]
+    assert select_download_info(infos, ['mp3'], 64) is infos[2]
+    assert select_download_info(infos, ['flac', 'aac'], 320) is infos[1]
+    assert select_download_info(infos, ['flac'], 320) is None
+
+
+def test_playback_resolves_selected_variant_only(playback, client, mopidy_track):
+    infos = client.tracks_download_info.return_value
+    playback.translate_uri(mopidy_track.uri)
+    infos[2].get_direct_link.assert_called_once_with()
+    for info in (infos[0], infos[1], infos[3]):
+        info.get_direct_link.assert_not_called()
+
+
+def test_playback_link_cache(playback, client, mopidy_track):
+    assert playback.translate_uri(mopidy_track.uri) == 'https://server.com/track/128/mp3'
+    assert playback.translate_uri(mopidy_track.uri) == 'https://server.com/track/128/mp3'
+    client.tracks_download_info.assert_called_once()
+
+    playback.links.clear()
+    assert playback.translate_uri(mopidy_track.uri) == 'https://server.com/track/128/mp3'
+    assert client.tracks_download_info.call_count == 2
 
 
-def test_playlists_as_list(playlists):
-    assert playlists.as_list() == [WORLD_TOP_100]
+def test_playback_audio_cache(playback, client, mopidy_track, tmp_path):
+    playback.backend.audio_cache = audio_cache = mock.Mock()
+    audio_cache.get.return_value = None
+    assert playback.translate_uri(mopidy_track.uri) == 'https://server.com/track/128/mp3'
+    audio_cache.download.assert_called_once_with('track-0001-128.mp3', 'https://server.com/track/128/mp3')
+
+    audio_cache.get.return_value = tmp_path / 'track-0001-128.mp3'
+    assert playback.translate_uri(mopidy_track.uri) == (tmp_path / 'track-0001-128.mp3').as_uri()
+    audio_cache.get.assert_called_with('track-0001-128.mp3')
+    client.tracks_download_info.assert_called_once()
+
+
+def test_playback_audio_cache_names_selected_variant(playback, config, mopidy_track):
+    config['ymusic']['bitrate'] = 192
+    playback.backend.audio_cache = audio_cache = mock.Mock()
+    audio_cache.get.return_value = None
+    assert playback.translate_uri(mopidy_track.uri) == 'https://server.com/track/128/mp3'
+    audio_cache.download.assert_called_once_with('track-0001-128.mp3', 'https://server.com/track/128/mp3')
+
+
+def test_playback_audio_cache_hit_before_variant_known(playback, client, mopidy_track, tmp_path):
+    playback.backend.audio_cache = audio_cache = mock.Mock()
+    audio_cache.get.return_value = tmp_path / 'track-0001-128.mp3'
+    assert playback.translate_uri(mopidy_track.uri) == (tmp_path / 'track-0001-128.mp3').as_uri()
+    audio_cache.get.assert_called_once_with('track-0001-128.mp3')
+    audio_cache.download.assert_not_called()
+    client.tracks_download_info.assert_called_once()
+
+
+def test_playback_prefetch_next_uris(playback):
+    tl_tracks = [TlTrack(tlid, MopidyTrack(uri=f'ymusic:track:{tlid}')) for tlid in range(4)]
+    tracklist = mock.Mock()
+    tracklist.get_tl_tracks.return_value.get.return_value = tl_tracks
+    tracklist.next_track.side_effect = lambda tl_track: mock.Mock(**{
+        'get.return_value': tl_tracks[tl_track.tlid + 1] if tl_track.tlid + 1 < len(tl_tracks) else None,
+    })
+    core = mock.Mock(**{'proxy.return_value.tracklist': tracklist})
+
+    with mock.patch('pykka.ActorRegistry.get_by_class_name', return_value=[core]):
+        assert playback.prefetcher._get_next_uris('ymusic:track:0') == ['ymusic:track:1', 'ymusic:track:2']
+        assert playback.prefetcher._get_next_uris('ymusic:track:2') == ['ymusic:track:3']
+
+
+def test_playlists_as_list(playlists, user_playlist):
+    assert playlists.as_list() == [
+        WORLD_TOP_100,
+        LIKED_TRACKS,
+        Ref.playlist(uri='ymusic:playlist:1000:3', name=user_playlist.title),
+    ]
+
+
+def test_playlists_as_list_without_user_library(config, client):
+    config['ymusic']['user_library'] = False
+    backend = YMusicBackend(config, None)
+    backend.client = client
+    assert backend.playlists.as_list() == [WORLD_TOP_100]
+    assert backend.library.browse(LIBRARY_DIR.uri) == []
+    client.users_playlists_list.assert_not_called()
+
+
+def test_user_library(library, playlists, album, mopidy_track):
+    user_playlist_ref = Ref.playlist(uri='ymusic:playlist:1000:3', name='My Playlist')
+    track_ref = Ref.track(uri=mopidy_track.uri, name=mopidy_track.name)
+    assert library.browse(LIBRARY_DIR.uri) == [LIKED_TRACKS, user_playlist_ref, LIKED_ALBUMS_DIR]
+    assert library.browse(LIKED_ALBUMS_DIR.uri) == [Ref.album(uri=f'ymusic:album:{album.id}', name=album.title)]
+
+    assert playlists.get_items(LIKED_TRACKS.uri) == [track_ref]
+    assert playlists.get_items(user_playlist_ref.uri) == [track_ref]
+    assert playlists.lookup(user_playlist_ref.uri) == Playlist(
+        uri=user_playlist_ref.uri,
+        name=user_playlist_ref.name,
+        tracks=[mopidy_track],
+    )
+
+
+def test_user_library_incremental_sync(playlists, client, album, artist, track, user_playlist):
+    playlists.as_list()
+    client.playlists_list.assert_called_once_with(['1000:3'])
+    client.tracks.assert_called_once_with([track.id])
+
+    playlists.refresh()
+    client.playlists_list.assert_called_once()
+    client.tracks.assert_called_once()
+    client.users_likes_tracks.assert_called_with(if_modified_since_revision=1)
+
+    new_track = Track(id='track-0002', title='Track 02 Title', artists=[artist], albums=[album])
+    client.tracks.return_value = [new_track]
+    client.users_likes_tracks.return_value = TracksList(
+        uid=1000, revision=2, tracks=[TrackShort(id=new_track.id, timestamp=''), TrackShort(id=track.id, timestamp='')],
+    )
+    user_playlist.revision = 2
+    playlists.refresh()
+    assert client.playlists_list.call_count == 2
+    client.tracks.assert_called_with([new_track.id])
+    liked = playlists.get_items(LIKED_TRACKS.uri)
+    assert [ref.uri for ref in liked] == ['ymusic:track:track-0002', 'ymusic:track:track-0001']
+
+
+def test_user_library_survives_restart(backend, client, tmp_path):
+    backend.cache.store = MetadataStore(tmp_path / 'metadata.sqlite3')
+    backend.sync.ensure()
+
+    synced = LibrarySync(backend)
+    assert synced.as_list() == backend.sync.as_list()
+    assert synced.likes == backend.sync.likes
+    client.playlists_list.assert_called_once()
+    backend.cache.close()
 
 
 def test_playlists_get_items(playlists, mopidy_playlist, mopidy_track, tracks_event):
@@ -107,6 +449,25 @@ def test_playlists_get_items(playlists, mopidy_playlist, mopidy_track, tracks_ev
     assert track_ref == Ref.track(uri=mopidy_track.uri, name=mopidy_track.name)
 
 
+def test_playlists_get_items_skips_track_models(playlists, mopidy_playlist, mopidy_track):
+    with mock.patch('mopidy_ymusic.playlist.to_model') as to_model:
+        assert playlists.get_items(mopidy_playlist.uri) == [Ref.track(uri=mopidy_track.uri, name=mopidy_track.name)]
+    to_model.assert_not_called()
+
+    # Ref lists and full playlists are cached separately.
+    assert playlists.lookup(mopidy_playlist.uri) == mopidy_playlist
+
+
+def test_playlists_refresh(playlists, client):
+    playlists.lookup(WORLD_TOP_100.uri)
+    playlists.lookup(WORLD_TOP_100.uri)
+    client.chart.assert_called_once()
+
+    playlists.refresh()
+    playlists.lookup(WORLD_TOP_100.uri)
+    assert client.chart.call_count == 2
+
+
 def test_playlists_lookup(playlists, mopidy_playlist, tracks_event, mopidy_track):
     assert playlists.lookup(mopidy_playlist.uri) == mopidy_playlist
 
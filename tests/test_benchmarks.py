@@ -0,0 +1,80 @@
+import json
+import threading
+
+import pytest
+from benchmarks import run
+from benchmarks.fake import FakeClient
+from benchmarks.server import StandInServer
+
+from mopidy_ymusic.backend import YMusicBackend
+from mopidy_ymusic.radio import RADIO_URI
+
+
+def test_fake_client_counts_calls():
+    client = FakeClient(size=10)
+    assert len(client.albums_with_tracks('1').volumes[0]) == 10
+    assert [track.id for track in client.tracks(['3', '4'])] == ['3', '4']
+    assert client.calls == {'albums_with_tracks': 1, 'tracks': 1}
+
+
+def test_benchmarks_run(capsys):
+    run.main(['--size', '5', '--latency', '0', '--json'])
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert {result['operation'] for result in results} == {name for name, _ in run.operations(5)}
+    assert all(result['calls'] > 0 and result['warm_calls'] == 0 for result in results)
+
+
+@pytest.fixture
+def standin():
+    server = StandInServer(('127.0.0.1', 0), FakeClient(size=5), audio_seconds=0.1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_backend_against_standin_server(config, standin):
+    config['ymusic'].update(token='standin', base_url=f'http://127.0.0.1:{standin.server_port}')
+    backend = YMusicBackend(config, None)
+
+    tracks = backend.library.lookup('ymusic:album:1')
+    assert [track.name for track in tracks] == [f'Track {index}' for index in range(5, 10)]
+    assert backend.library.search({'any': ['track']}, None).tracks
+    assert len(backend.playlists.get_items('ymusic:playlist:world')) == 5
+    assert 'ymusic:playlist:likes' in [ref.uri for ref in backend.playlists.as_list()]
+
+    link = backend.playback.translate_uri('ymusic:track:1')
+    assert link.startswith(f'{config["ymusic"]["base_url"]}/get-mp3/')
+    assert backend.request.session.get(link).content == standin.audio
+    assert standin.fake.calls['get_direct_link'] == 1
+
+
+def test_get_images_against_standin_server(config, standin):
+    config['ymusic'].update(token='standin', base_url=f'http://127.0.0.1:{standin.server_port}')
+    backend = YMusicBackend(config, None)
+
+    uris = ['ymusic:track:1', 'ymusic:album:2', 'ymusic:artist:3', 'ymusic:playlist:1000:1', 'ymusic:playlist:world']
+    images = backend.library.get_images(uris)
+    assert set(images) == set(uris)
+    assert images['ymusic:album:2'][0].uri == 'https://avatars.yandex.net/get-music-content/album/2/400x400'
+    assert {method: standin.fake.calls[method] for method in ('tracks', 'albums', 'artists', 'chart')} == {
+        'tracks': 1, 'albums': 1, 'artists': 1, 'chart': 1,
+    }
+
+
+def test_radio_against_standin_server(config, standin):
+    config['ymusic'].update(
+        token='standin',
+        base_url=f'http://127.0.0.1:{standin.server_port}',
+        radio_station='user:onyourwave',
+    )
+    backend = YMusicBackend(config, None)
+    backend.radio.start()
+    refs = backend.playlists.get_items(RADIO_URI)
+    backend.radio.stop()
+
+    assert [ref.name for ref in refs] == [f'Track {index}' for index in range(5)]
+    assert backend.playback.translate_uri(refs[0].uri).startswith(f'{config["ymusic"]["base_url"]}/get-mp3/')
+    assert standin.fake.calls['rotor_station_tracks'] == 1
+    assert standin.fake.calls['rotor_station_feedback'] == 1
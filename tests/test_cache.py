@@ -0,0 +1,43 @@
+from unittest import mock
+
+from mopidy_ymusic.cache import MetadataCache, TTLCache
+
+
+def test_ttl_cache_expiry():
+    cache = TTLCache(ttl=10)
+    with mock.patch('time.monotonic', return_value=100):
+        cache.set('key', 'value')
+        cache.set('short', 'value', ttl=1)
+    with mock.patch('time.monotonic', return_value=105):
+        assert cache.get('key') == 'value'
+        assert cache.get('short') is None
+    with mock.patch('time.monotonic', return_value=110):
+        assert cache.get('key') is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(ttl=10, maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_metadata_cache():
+    cache = MetadataCache(ttls=[('album', 10)], maxsize=10)
+    loader = mock.Mock(return_value=['track'])
+    assert cache.get_or_load('album', 'ymusic:album:1', loader, op='lookup') == ['track']
+    assert cache.get_or_load('album', 'ymusic:album:1', loader, op='lookup') == ['track']
+    assert loader.call_count == 1
+    assert cache.stats() == {'album': {'hits': 1, 'misses': 1}}
+
+    cache.set('album', 'ymusic:album:1', ['ref'], op='browse')
+    cache.set('artist', 'ymusic:artist:1', ['ref'], op='browse')
+    cache.invalidate(uri='ymusic:album:1')
+    assert len(cache) == 1
+    cache.invalidate(kind='artist')
+    assert len(cache) == 0
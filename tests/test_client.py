@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pykka
+import pytest
+from mopidy.exceptions import BackendError
+from yandex_music import Client
+from yandex_music.exceptions import NetworkError, NotFoundError
+
+from mopidy_ymusic.backend import YMusicBackend
+from mopidy_ymusic.client import LazyClient, PooledRequest, SingleFlightClient, _Flight
+
+
+def test_single_flight_shares_result():
+    started, release = threading.Event(), threading.Event()
+    upstream = mock.Mock()
+
+    def chart(chart_option):
+        started.set()
+        release.wait(5)
+        return f'chart {chart_option}'
+
+    upstream.chart.side_effect = chart
+    client = SingleFlightClient(upstream)
+    waiting = threading.Semaphore(0)
+
+    def wait(flight):
+        waiting.release()
+        return flight_wait(flight)
+
+    flight_wait = _Flight.wait
+    with ThreadPoolExecutor(max_workers=3) as executor, mock.patch.object(_Flight, 'wait', wait):
+        first = executor.submit(client.chart, 'world')
+        assert started.wait(1)
+        followers = [executor.submit(client.chart, 'world') for _ in range(2)]
+        assert waiting.acquire(timeout=1) and waiting.acquire(timeout=1)
+        release.set()
+        assert [future.result(1) for future in [first, *followers]] == ['chart world'] * 3
+    upstream.chart.assert_called_once_with('world')
+
+    assert client.chart('russia') == 'chart russia'
+    assert upstream.chart.call_count == 2
+
+
+def test_single_flight_shares_error():
+    upstream = mock.Mock(token='token')
+    upstream.feed.side_effect = RuntimeError('unavailable')
+    client = SingleFlightClient(upstream)
+    with pytest.raises(RuntimeError):
+        client.feed()
+    assert not client._flights
+    assert client.token == 'token'
+
+
+def test_lazy_client_waits_for_init():
+    release = threading.Event()
+    upstream = mock.Mock(token='token')
+    factory = mock.Mock(side_effect=[RuntimeError('unreachable'), upstream])
+    client = LazyClient(lambda: release.wait(5) and factory(), timeout=0.05)
+    client.start()
+
+    with pytest.raises(BackendError):
+        client.token
+    release.set()
+    assert client.ready.wait(1)
+
+    # The first initialization failed, the next access retries it.
+    client.timeout = 1
+    assert client.token == 'token'
+    assert factory.call_count == 2
+
+
+def test_pooled_request_retries(http_server):
+    url, responses = http_server
+    request = PooledRequest(pool_size=2, connect_timeout=1, read_timeout=1, retries=1, backoff=0)
+    Client('token', request=request)
+    responses.extend([(503, b'{}'), (200, b'{"result": {"ok": true}}')])
+    assert request.get(f'{url}/feed') == {'ok': True}
+
+    responses.extend([(503, b'{}'), (503, b'{}')])
+    with pytest.raises(NetworkError):
+        request.get(f'{url}/feed')
+
+    responses.append((404, b'{"error": "not-found"}'))
+    with pytest.raises(NotFoundError):
+        request.get(f'{url}/feed')
+
+    responses.extend([(503, b'{}'), (200, b'{"result": "ok"}')])
+    with pytest.raises(NetworkError):
+        request.post(f'{url}/rotor/station/user:onyourwave/feedback', json={'type': 'skip'})
+    assert len(responses) == 1
+    request.close()
+
+
+def test_proxy_does_not_wait_for_client(config):
+    release = threading.Event()
+    with mock.patch('mopidy_ymusic.backend.Client', side_effect=lambda *args, **kwargs: release.wait(5)):
+        actor_ref = YMusicBackend.start(config, None)
+    try:
+        started = time.monotonic()
+        proxy = pykka.ActorProxy(actor_ref=actor_ref)
+        assert time.monotonic() - started < config['ymusic']['init_timeout'] / 2
+        assert proxy.playlists.as_list().get(1)
+    finally:
+        release.set()
+        actor_ref.stop()
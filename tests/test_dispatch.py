@@ -0,0 +1,114 @@
+import threading
+from unittest import mock
+
+import pykka
+import pytest
+from yandex_music import Track
+
+from mopidy_ymusic.backend import YMusicBackend
+from mopidy_ymusic.dispatch import PriorityExecutor
+
+
+@pytest.fixture
+def audio():
+    audio = mock.Mock()
+    audio.get_position.return_value.get.return_value = 0
+    return audio
+
+
+@pytest.fixture
+def start_backend(config, client, audio):
+    client.init.return_value = client
+    actor_refs = []
+
+    def start():
+        actor_refs.append(YMusicBackend.start(config, audio))
+        # Proxy calls start being dispatched once on_start has run.
+        actor_refs[-1].proxy().ping().get()
+        return actor_refs[-1]
+
+    with mock.patch('mopidy_ymusic.backend.Client', return_value=client):
+        yield start
+        for actor_ref in actor_refs:
+            actor_ref.stop()
+
+
+@pytest.fixture
+def backend_ref(start_backend):
+    return start_backend()
+
+
+def test_priority_executor_order():
+    executor = PriorityExecutor(workers=1)
+    gate = threading.Event()
+    done = threading.Event()
+    calls = []
+    executor.submit(1, gate.wait)
+    executor.submit(3, calls.append, 'images')
+    executor.submit(2, calls.append, 'browse')
+    executor.submit(3, done.set)
+    executor.start()
+    gate.set()
+    assert done.wait(1)
+    executor.shutdown()
+    assert calls == ['browse', 'images']
+
+
+def test_playback_does_not_wait_for_browse(backend_ref, client, audio, mopidy_album, mopidy_track):
+    started, release = threading.Event(), threading.Event()
+    album = client.albums_with_tracks.return_value
+
+    def albums_with_tracks(album_id):
+        started.set()
+        release.wait(5)
+        return album
+
+    client.albums_with_tracks.side_effect = albums_with_tracks
+    backend = backend_ref.proxy()
+    browse = backend.library.browse(mopidy_album.uri)
+    assert started.wait(1)
+
+    # The calls core makes to change the playing track run on the urgent thread.
+    threads = []
+    audio.set_uri.side_effect = lambda *args, **kwargs: threads.append(threading.current_thread().name) or mock.Mock()
+    backend.playback.prepare_change()
+    assert backend.playback.change_track(mopidy_track).get(1) is True
+    audio.set_uri.assert_called_once_with('https://server.com/track/128/mp3', live_stream=False, download=False)
+    assert threads == ['YMusicWorker-urgent']
+    assert backend.library.lookup(mopidy_track.uri).get(1) == [mopidy_track]
+    with pytest.raises(pykka.Timeout):
+        browse.get(0)
+
+    release.set()
+    assert len(browse.get(1)) == 1
+
+
+def test_calls_are_timed(backend_ref, mopidy_album, mopidy_track):
+    backend = backend_ref.proxy()
+    backend.library.browse(mopidy_album.uri).get(1)
+    backend.library.lookup(mopidy_track.uri).get(1)
+
+    histograms = backend.metrics.histograms.get(1)
+    for call in ('library.browse', 'library.lookup'):
+        assert histograms['queue'][call].count == 1
+        assert histograms['call'][call].count == 1
+    assert histograms['api']['albums_with_tracks'].count == 1
+    assert histograms['convert']['lookup'].count == 1
+
+
+def test_lookups_are_batched(start_backend, config, client, artist, album):
+    config['ymusic']['priorities'].append(('library.lookup', 1))
+    client.tracks.side_effect = lambda ids: [
+        Track(id=track_id, title=f'Title {track_id}', artists=[artist], albums=[album]) for track_id in ids
+    ]
+    backend = start_backend().proxy()
+
+    uris = [f'ymusic:track:track-{index:04}' for index in range(10)]
+    # Mopidy core sends one library.lookup per URI and only then waits for the results.
+    futures = [backend.library.lookup(uri) for uri in uris]
+    assert [future.get(1)[0].uri for future in futures] == uris
+    client.tracks.assert_called_once_with([uri.split(':')[2] for uri in uris])
+
+    histograms = backend.metrics.histograms.get(1)
+    assert histograms['queue']['library.lookup'].count == 10
+    assert histograms['call']['library.lookup_many'].count == 1
@@ -0,0 +1,41 @@
+import os
+
+import requests
+
+from mopidy_ymusic.files import FileCache
+
+
+def test_file_cache_download(tmp_path, http_server):
+    url, responses = http_server
+    responses.append((200, b'audio'))
+    cache = FileCache(tmp_path, max_bytes=100, session=requests.Session(), timeout=1)
+    assert cache.get('1-320.mp3') is None
+
+    cache.download('1-320.mp3', f'{url}/1')
+    cache._executor.shutdown(wait=True)
+    assert cache.get('1-320.mp3').read_bytes() == b'audio'
+    assert cache.size == 5
+
+
+def test_file_cache_failed_download(tmp_path, http_server):
+    url, responses = http_server
+    responses.append((404, b''))
+    cache = FileCache(tmp_path, max_bytes=100, session=requests.Session(), timeout=1)
+    cache.download('1-320.mp3', f'{url}/1')
+    cache._executor.shutdown(wait=True)
+    assert cache.get('1-320.mp3') is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_file_cache_evicts_least_recently_used(tmp_path):
+    for index, name in enumerate(['a', 'b', 'c', 'd.part']):
+        (tmp_path / name).write_bytes(b'x' * 10)
+        os.utime(tmp_path / name, (index, index))
+
+    cache = FileCache(tmp_path, max_bytes=25, session=None, timeout=1)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['b', 'c']
+    assert cache.get('b') == tmp_path / 'b'
+
+    cache = FileCache(tmp_path, max_bytes=15, session=None, timeout=1)
+    assert [path.name for path in tmp_path.iterdir()] == ['b']
+    assert len(cache) == 1
@@ -0,0 +1,66 @@
+from mopidy.models import Album, Artist, Track
+
+from mopidy_ymusic.index import SearchIndex
+
+
+def test_index_search(mopidy_track, mopidy_album, mopidy_artist):
+    index = SearchIndex()
+    index.add([mopidy_track])
+    index.add([mopidy_track])
+    assert len(index) == 3
+
+    result = index.search({'any': ['artist 01']})
+    assert result.tracks == (mopidy_track,)
+    assert result.albums == (mopidy_album,)
+    assert result.artists == (mopidy_artist,)
+
+    result = index.search({'track_name': ['Trac'], 'album': ['album']})
+    assert result.tracks == (mopidy_track,)
+    assert result.albums == ()
+
+    assert not index.search({'track_name': ['Album']}).tracks
+    assert not index.search({'foobar': ['Track']}).tracks
+
+
+def test_index_exact_search():
+    artist = Artist(uri='ymusic:artist:1', name='Кино')
+    album = Album(uri='ymusic:album:1', name='Группа крови', artists=[artist])
+    track = Track(uri='ymusic:track:1', name='Кукушка', artists=[artist], album=album)
+    index = SearchIndex()
+    index.add([track])
+
+    result = index.search({'artist': ['КИНО']}, exact=True)
+    assert (result.tracks, result.albums, result.artists) == ((track,), (album,), (artist,))
+    assert not index.search({'artist': ['Кин']}, exact=True).artists
+    assert index.search({'artist': ['Кин']}).artists == (artist,)
+
+
+def test_index_updates_changed_models(mopidy_track):
+    index = SearchIndex()
+    index.add([mopidy_track])
+    renamed = mopidy_track.replace(name='Renamed')
+    index.add([renamed])
+
+    assert index.search({'track_name': ['Renamed']}).tracks == (renamed,)
+    assert not index.search({'track_name': ['Track']}).tracks
+
+
+def test_index_persists(tmp_path, mopidy_track):
+    index = SearchIndex(tmp_path / 'search.sqlite3')
+    index.add([mopidy_track])
+    index.close()
+
+    index = SearchIndex(tmp_path / 'search.sqlite3')
+    assert index.search({'any': ['track']}).tracks == (mopidy_track,)
+
+
+def test_index_writes_behind(tmp_path, mopidy_track):
+    path = tmp_path / 'search.sqlite3'
+    index = SearchIndex(path)
+    index.add([mopidy_track])
+    index.flush()
+    index.add([mopidy_track.replace(name='Renamed')])
+    index.close()
+
+    index = SearchIndex(path)
+    assert index.search({'track_name': ['Renamed']}).tracks == (mopidy_track.replace(name='Renamed'),)
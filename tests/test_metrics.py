@@ -0,0 +1,47 @@
+import pytest
+
+from mopidy_ymusic.metrics import Metrics
+
+
+def test_histogram_rendering():
+    metrics = Metrics()
+    metrics.observe('api', 'feed', 0.02)
+    metrics.observe('api', 'feed', 0.3)
+    metrics.register_cache('links', lambda: {'link': {'hits': 3, 'misses': 1}})
+
+    lines = metrics.render().splitlines()
+    assert 'ymusic_api_request_duration_seconds_bucket{method="feed",le="0.01"} 0' in lines
+    assert 'ymusic_api_request_duration_seconds_bucket{method="feed",le="0.025"} 1' in lines
+    assert 'ymusic_api_request_duration_seconds_bucket{method="feed",le="+Inf"} 2' in lines
+    assert 'ymusic_api_request_duration_seconds_count{method="feed"} 2' in lines
+    assert 'ymusic_cache_requests_total{cache="links",kind="link",result="hit"} 3' in lines
+    assert 'ymusic_cache_requests_total{cache="links",kind="link",result="miss"} 1' in lines
+
+
+def test_api_errors():
+    metrics = Metrics()
+
+    def fail():
+        raise ValueError()
+
+    assert metrics.call_api('feed', lambda: 'feed') == 'feed'
+    with pytest.raises(ValueError):
+        metrics.call_api('tracks', fail)
+
+    assert metrics.histograms['api']['tracks'].count == 1
+    assert 'ymusic_api_errors_total{method="tracks"} 1' in metrics.render().splitlines()
+    assert metrics.summary().startswith('API: 2 calls, 1 errors')
+
+
+def test_backend_metrics(backend, library, playback, mopidy_track):
+    library.lookup(mopidy_track.uri)
+    library.lookup(mopidy_track.uri)
+    playback.translate_uri(mopidy_track.uri)
+
+    api = backend.metrics.histograms['api']
+    assert api['tracks'].count == 1
+    assert api['tracks_download_info'].count == 1
+    assert api['get_direct_link'].count == 1
+    stats = backend.metrics.cache_stats()
+    assert stats['metadata']['track'] == {'hits': 1, 'misses': 1}
+    assert stats['links']['link'] == {'hits': 0, 'misses': 1}
@@ -0,0 +1,21 @@
+from unittest import mock
+
+from mopidy.models import Artist as MopidyArtist
+
+from mopidy_ymusic.models import to_model
+
+
+def test_to_model_interns_artists_and_albums(track, artist, mopidy_track):
+    first = to_model(track)
+    with mock.patch('mopidy_ymusic.models.Artist') as artist_model, \
+            mock.patch('mopidy_ymusic.models.Album') as album_model:
+        second = to_model(track)
+    artist_model.assert_not_called()
+    album_model.assert_not_called()
+    assert second == first == mopidy_track
+    assert second.album is first.album
+    [first_artist], [second_artist] = first.artists, second.artists
+    assert second_artist is first_artist
+
+    artist.name = 'Renamed Artist'
+    assert to_model(artist) == MopidyArtist(uri=first_artist.uri, name=artist.name, sortname=artist.name)
@@ -0,0 +1,123 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+from mopidy.models import Ref
+from yandex_music import Sequence, StationTracksResult, Track
+
+from mopidy_ymusic.backend import YMusicBackend
+from mopidy_ymusic.radio import RADIO_URI
+
+
+@pytest.fixture
+def radio_tracks(album, artist):
+    return [
+        Track(id=f'radio-{index}', title=f'Radio {index}', artists=[artist], albums=[album], duration_ms=200000)
+        for index in range(4)
+    ]
+
+
+@pytest.fixture
+def radio_backend(config, client, radio_tracks):
+    config['ymusic']['radio_station'] = 'user:onyourwave'
+    batches = iter([radio_tracks[:2], radio_tracks[2:]])
+    client.rotor_station_tracks.side_effect = lambda station, queue=None: StationTracksResult(
+        id=None,
+        sequence=[Sequence(type='track', track=track, liked=False) for track in next(batches)],
+        batch_id=f'batch-{queue}',
+        pumpkin=False,
+    )
+    audio = mock.Mock()
+    audio.get_position.return_value.get.return_value = 10000
+    backend = YMusicBackend(config, audio)
+    backend.client = client
+    yield backend
+    backend.radio.stop()
+
+
+def test_radio_playlist(radio_backend, client, radio_tracks):
+    radio = radio_backend.radio
+    assert radio.ref in radio_backend.playlists.as_list()
+    assert radio.ref in radio_backend.library.browse(radio_backend.library.root_directory.uri)
+    client.playlists_list.reset_mock()
+    assert radio_backend.library.get_images([radio.ref.uri]) == {}
+    client.playlists_list.assert_not_called()
+
+    refs = radio_backend.playlists.get_items(RADIO_URI)
+    assert refs == [Ref.track(uri=f'ymusic:track:{track.id}', name=track.title) for track in radio_tracks[:2]]
+    assert client.tracks_download_info.call_count == 2
+    client.tracks.reset_mock()
+    assert radio_backend.library.lookup(refs[0].uri)[0].name == 'Radio 0'
+    client.tracks.assert_not_called()
+
+    # Opening the playlist again lists the same tracks without asking the station for more.
+    assert [track.uri for track in radio_backend.playlists.lookup(RADIO_URI).tracks] == [ref.uri for ref in refs]
+    client.rotor_station_tracks.assert_called_once_with('user:onyourwave', queue=None)
+
+
+def test_radio_refill_and_feedback(radio_backend, client):
+    core = mock.Mock()
+    tracklist = core.proxy.return_value.tracklist
+    added = threading.Event()
+    first, second = radio_backend.playlists.lookup(RADIO_URI).tracks
+    listed = [first.uri, second.uri]
+    tracklist.get_tracks.return_value.get.side_effect = lambda timeout: [Ref.track(uri=uri) for uri in listed]
+    tracklist.add.side_effect = lambda uris: listed.extend(uris) or added.set()
+
+    with mock.patch('pykka.ActorRegistry.get_by_class_name', return_value=[core]):
+        radio_backend.radio.start()
+        radio_backend.playback.change_track(first)
+        assert added.wait(1)
+        tracklist.add.assert_called_once_with(uris=['ymusic:track:radio-2', 'ymusic:track:radio-3'])
+
+        radio_backend.playback.prepare_change()
+        radio_backend.playback.change_track(second)
+        radio_backend.radio.stop()
+
+    tracklist.add.assert_called_once()
+    assert [model.uri for model in radio_backend.radio.buffer] == ['ymusic:track:radio-2', 'ymusic:track:radio-3']
+    assert list(radio_backend.radio.batches) == ['batch-radio-1', 'batch-radio-1']
+    calls = [kwargs for _, kwargs in client.rotor_station_feedback.call_args_list]
+    assert [(kwargs['type_'], kwargs.get('track_id')) for kwargs in calls] == [
+        ('radioStarted', None),
+        ('trackStarted', 'radio-0'),
+        ('skip', 'radio-0'),
+        ('trackStarted', 'radio-1'),
+    ]
+    assert calls[2]['total_played_seconds'] == 10
+    assert calls[2]['batch_id'] == 'batch-None'
+
+
+def test_radio_refreshes_buffered_links(radio_backend, client):
+    radio = radio_backend.radio
+    radio.tracks()
+    client.tracks_download_info.reset_mock()
+    radio._refresh_links()
+    client.tracks_download_info.assert_not_called()
+
+    with mock.patch('time.monotonic', return_value=time.monotonic() + radio.link_refresh):
+        radio._refresh_links()
+    assert client.tracks_download_info.call_count == 2
+
+
+def test_radio_repeated_track(radio_backend, client, radio_tracks):
+    first, second, third = radio_tracks[:3]
+    batches = iter([[first, second], [third, first]])
+    client.rotor_station_tracks.side_effect = lambda station, queue=None: StationTracksResult(
+        id=None,
+        sequence=[Sequence(type='track', track=track, liked=False) for track in next(batches)],
+        batch_id=f'batch-{queue}',
+        pumpkin=False,
+    )
+    radio = radio_backend.radio
+    radio.size = 4
+    tracks = radio.tracks()
+    assert [track.uri for track in tracks] == [f'ymusic:track:{track.id}' for track in [first, second, third, first]]
+
+    for track in tracks:
+        radio.track_changed(track, None)
+    started = [(item['track_id'], item['batch_id']) for item in radio.feedback if item['type_'] == 'trackStarted']
+    assert started == [('radio-0', 'batch-None'), ('radio-1', 'batch-None'), ('radio-2', 'batch-radio-1'),
+                       ('radio-0', 'batch-radio-1')]
+    assert not radio.buffer and not radio.batches
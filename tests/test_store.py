@@ -0,0 +1,77 @@
+import sqlite3
+from unittest import mock
+
+from mopidy.models import Ref
+
+from mopidy_ymusic.cache import MetadataCache
+from mopidy_ymusic.store import SCHEMA_VERSION, MetadataStore
+
+
+def test_store_roundtrip(tmp_path, mopidy_track):
+    store = MetadataStore(tmp_path / 'metadata.sqlite3')
+    refs = [Ref.track(uri=mopidy_track.uri, name=mopidy_track.name)]
+    store.set('album', 'ymusic:album:1', refs, op='browse')
+    store.set('album', 'ymusic:album:1', [mopidy_track], op='lookup')
+    store.close()
+
+    store = MetadataStore(tmp_path / 'metadata.sqlite3')
+    value, _ = store.get('album', 'ymusic:album:1', op='browse')
+    assert value == refs
+    value, _ = store.get('album', 'ymusic:album:1', op='lookup')
+    assert value == [mopidy_track]
+
+    store.invalidate(uri='ymusic:album:1')
+    assert store.get('album', 'ymusic:album:1', op='browse') is None
+
+
+def test_store_schema_version(tmp_path):
+    path = tmp_path / 'metadata.sqlite3'
+    db = sqlite3.connect(str(path))
+    db.execute('CREATE TABLE entries (data TEXT)')
+    db.execute(f'PRAGMA user_version = {SCHEMA_VERSION + 1}')
+    db.close()
+
+    store = MetadataStore(path)
+    store.set('track', 'ymusic:track:1', [])
+    assert store.get('track', 'ymusic:track:1')[0] == []
+
+
+def test_cache_serves_stale_store_entries(tmp_path):
+    store = MetadataStore(tmp_path / 'metadata.sqlite3')
+    with mock.patch('time.time', return_value=0):
+        store.set('feed', 'ymusic:directory:root', ['old'], op='browse')
+
+    cache = MetadataCache(ttls=[('feed', 10)], maxsize=10, store=store)
+    loader = mock.Mock(return_value=['new'])
+    assert cache.get_or_load('feed', 'ymusic:directory:root', loader, op='browse') == ['old']
+    cache._executor.shutdown(wait=True)
+    loader.assert_called_once_with()
+    assert cache.get_or_load('feed', 'ymusic:directory:root', loader, op='browse') == ['new']
+    assert store.get('feed', 'ymusic:directory:root', op='browse')[0] == ['new']
+
+
+def test_store_writes_behind(tmp_path):
+    store = MetadataStore(tmp_path / 'metadata.sqlite3')
+    for index in range(3):
+        store.set('track', f'ymusic:track:{index}', [index])
+    assert store.get('track', 'ymusic:track:2')[0] == [2]
+
+    db = sqlite3.connect(str(tmp_path / 'metadata.sqlite3'))
+    store.flush()
+    assert db.execute('SELECT COUNT(*) FROM entries').fetchone() == (3,)
+    store.close()
+
+
+def test_store_prunes_old_and_extra_entries(tmp_path):
+    path = tmp_path / 'metadata.sqlite3'
+    store = MetadataStore(path)
+    for index, updated_at in enumerate((0, 1000, 2000, 3000)):
+        with mock.patch('time.time', return_value=updated_at):
+            store.set('track', f'ymusic:track:{index}', [])
+    store.close()
+
+    with mock.patch('time.time', return_value=3500):
+        store = MetadataStore(path, ttl=3000, maxsize=2)
+    assert [store.get('track', f'ymusic:track:{index}') is not None for index in range(4)] == [
+        False, False, True, True,
+    ]
@@ -0,0 +1,38 @@
+import threading
+
+from mopidy_ymusic.backend import YMusicBackend
+
+
+def test_warm_up_caches_interactive_requests(config, client, chart):
+    config['ymusic']['charts'] = ['world', 'russia']
+    backend = YMusicBackend(config, None)
+    backend.client = client
+    backend.warm_up.run()
+    client.chart.assert_any_call('russia')
+    client.reset_mock()
+
+    library, playlists = backend.library, backend.playlists
+    root = library.browse(library.root_directory.uri)
+    for ref in root:
+        if ref.type == 'directory' and ref.uri != backend.sync.root_directory.uri:
+            assert library.browse(ref.uri)
+    for ref in playlists.as_list()[:2]:
+        assert len(playlists.get_items(ref.uri)) == len(chart.chart.tracks)
+        assert playlists.lookup(ref.uri).tracks
+    library.get_images([ref.uri for ref in root])
+    assert client.mock_calls == []
+
+
+def test_warm_up_runs_at_startup(config, client):
+    config['ymusic']['warmup_interval'] = 3600
+    backend = YMusicBackend(config, None)
+    backend.client = client
+    fetched = threading.Event()
+    client.feed.side_effect = lambda: fetched.set() or client.feed.return_value
+    backend.warm_up.start()
+    thread = backend.warm_up._thread
+    try:
+        assert fetched.wait(1)
+    finally:
+        backend.warm_up.stop()
+    assert not thread.is_alive()
@@ -0,0 +1,63 @@
+import pathlib
+import tempfile
+
+import tornado.testing
+import tornado.web
+
+from mopidy_ymusic.metrics import Metrics, publish
+from mopidy_ymusic.web import ImageHandler, MetricsHandler, image_filename, local_image_uri
+
+
+class ImageHandlerTest(tornado.testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.path = pathlib.Path(tempfile.mkdtemp())
+        return tornado.web.Application([(r'/ymusic/images/(.+)', ImageHandler, {'path': self.path})])
+
+    def test_serves_cached_image(self):
+        url = 'https://avatars.yandex.net/get-music-content/1/cover/200x200'
+        (self.path / image_filename(url)).write_bytes(b'\x89PNG image')
+        response = self.fetch(local_image_uri(url))
+        assert response.code == 200
+        assert response.body == b'\x89PNG image'
+        assert response.headers['Content-Type'] == 'image/png'
+
+    def test_redirects_missing_image(self):
+        url = 'https://avatars.yandex.net/get-music-content/2/cover/200x200'
+        response = self.fetch(local_image_uri(url), follow_redirects=False)
+        assert response.code == 302
+        assert response.headers['Location'] == url
+
+    def test_rejects_other_hosts(self):
+        assert self.fetch('/ymusic/images/example.com/cover.jpg', follow_redirects=False).code == 404
+
+    def test_rejects_disguised_hosts(self):
+        for remote in (
+            'example.com%5C.yandex.net/cover.jpg',
+            'example.com%40avatars.yandex.net/cover.jpg',
+            'avatars.yandex.net:443%40example.com/cover.jpg',
+            'example.com%2F.yandex.net/cover.jpg',
+        ):
+            assert self.fetch(f'/ymusic/images/{remote}', follow_redirects=False).code == 404, remote
+
+
+class MetricsHandlerTest(tornado.testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return tornado.web.Application([(r'/ymusic/metrics', MetricsHandler)])
+
+    def tearDown(self):
+        publish(None)
+        super().tearDown()
+
+    def test_serves_backend_metrics(self):
+        metrics = Metrics()
+        metrics.observe('api', 'feed', 0.1)
+        publish(metrics)
+        response = self.fetch('/ymusic/metrics')
+        assert response.code == 200
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert b'ymusic_api_request_duration_seconds_count{method="feed"} 1' in response.body
+
+    def test_unavailable_without_backend(self):
+        assert self.fetch('/ymusic/metrics').code == 503